@@ -1,11 +1,13 @@
-from flask import Flask
 import os
 
 template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'templates'))
 static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'static'))
 
-app = Flask(__name__, 
-           template_folder=template_dir,
-           static_folder=static_dir)
-
-from app import routes
\ No newline at end of file
+def __getattr__(name):
+    # The Flask app is built by app.routes the first time it is asked for
+    # (wsgi.py, flask run), so the command line tools can import the
+    # calculation modules without starting the web app
+    if name == 'app':
+        from app.routes import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
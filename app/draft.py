@@ -0,0 +1,291 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from itertools import combinations
+
+from itsdangerous import URLSafeSerializer, BadSignature
+
+from app.team_comparison import adjusted_strength, weighted_team_elo, head_to_head_expected, position_assignments
+
+# Drafts are 4v4, like the balancer
+DRAFT_SIZE = 8
+
+# Metric fields a draft's strengths are calculated from
+DRAFT_FIELDS = ('name', 'weighted_average', 'team_rating', 'flank_multiplier', 'pocket_multiplier',
+                'recent_performance_multiplier')
+
+# Built sessions kept per instance (~3 MB each with positions), least
+# recently used dropped first
+MAX_SESSIONS = 16
+
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+class DraftSession:
+    """
+    A captain draft over a fixed pool of players.
+
+    Every complete split of the pool (including position assignments when
+    positions are used) is scored once when the session is built. Each pick
+    only filters that list down to the splits that still agree with the
+    locked players, and undo steps back to the previous list.
+
+    The draft itself (pool metrics, options and picks) travels in a signed
+    token. Built sessions are cached per instance by pool and options, so a
+    pick on the same instance only filters; an instance that doesn't have
+    the session builds it once from the token.
+    """
+
+    def __init__(self, metrics_list, use_positions=False, use_recent_performance=False,
+                 strength_key='weighted_average'):
+        if len(metrics_list) != DRAFT_SIZE:
+            raise ValueError(f"A draft needs exactly {DRAFT_SIZE} players")
+
+        self.players = [{k: m[k] for k in DRAFT_FIELDS if k in m} for m in metrics_list]
+        self.use_positions = use_positions
+        self.use_recent_performance = use_recent_performance
+        self.strength_key = strength_key
+        self.names = [m['name'] for m in metrics_list]
+        self.team_size = len(metrics_list) // 2
+        self.team_a = []
+        self.team_b = []
+        self.picks = []
+        self._history = []
+        self.pool_key = _pool_key(self.players, use_positions, use_recent_performance, strength_key)
+        # Held while a request replays and changes the session
+        self.lock = threading.Lock()
+
+        strengths = {}
+        for m in metrics_list:
+            for position in (['flank', 'pocket'] if use_positions else [None]):
+                strengths[(m['name'], position)] = adjusted_strength(
+                    m, position, use_positions, use_recent_performance, strength_key)
+
+        assignments = position_assignments(self.team_size, use_positions)
+        candidates = []
+        for team_a in combinations(self.names, self.team_size):
+            team_b = [name for name in self.names if name not in team_a]
+            for pos_a in assignments:
+                side_a = tuple(zip(team_a, pos_a))
+                strength_a = weighted_team_elo([strengths[p] for p in side_a])
+                for pos_b in assignments:
+                    side_b = tuple(zip(team_b, pos_b))
+                    strength_b = weighted_team_elo([strengths[p] for p in side_b])
+                    lookup = {name: ('A', pos) for name, pos in side_a}
+                    lookup.update({name: ('B', pos) for name, pos in side_b})
+                    candidates.append((abs(strength_a - strength_b), strength_a, strength_b,
+                                       side_a, side_b, lookup))
+
+        # Best balance first; filtering keeps this order
+        candidates.sort(key=lambda c: c[0])
+        self._candidates = candidates
+
+    @property
+    def available(self):
+        picked = {name for name, _ in self.team_a + self.team_b}
+        return [name for name in self.names if name not in picked]
+
+    @property
+    def next_team(self):
+        if len(self.team_a) == self.team_size and len(self.team_b) == self.team_size:
+            return None
+        if len(self.team_a) == self.team_size:
+            return 'B'
+        if len(self.team_b) == self.team_size:
+            return 'A'
+        return 'A' if len(self.team_a) <= len(self.team_b) else 'B'
+
+    def pick(self, name, team, position=None):
+        """
+        Lock a player onto a team, optionally at a position.
+        """
+        team = team.upper()
+        if team not in ('A', 'B'):
+            raise ValueError(f"Unknown team: {team}")
+        if name not in self.available:
+            raise ValueError(f"{name} is not available")
+        locked = self.team_a if team == 'A' else self.team_b
+        if len(locked) == self.team_size:
+            raise ValueError(f"Team {team} is already full")
+        if not self.use_positions:
+            position = None
+
+        remaining = [c for c in self._candidates
+                     if c[5][name][0] == team and (position is None or c[5][name][1] == position)]
+        if not remaining:
+            raise ValueError(f"No valid teams left with {name} on team {team}"
+                             + (f" as {position}" if position else ""))
+
+        self._history.append((self._candidates, team))
+        self._candidates = remaining
+        locked.append((name, position))
+        self.picks.append((name, team, position))
+
+    def undo(self):
+        """
+        Take back the last pick
+        """
+        if not self._history:
+            raise ValueError("Nothing to undo")
+        self._candidates, team = self._history.pop()
+        (self.team_a if team == 'A' else self.team_b).pop()
+        self.picks.pop()
+
+    def replay(self, picks):
+        """
+        Bring the session to the given list of (name, team, position) picks,
+        undoing only back to where it and the list differ
+        """
+        picks = [tuple(p) for p in picks]
+        common = 0
+        while common < min(len(picks), len(self.picks)) and self.picks[common] == picks[common]:
+            common += 1
+        while len(self.picks) > common:
+            self.undo()
+        for name, team, position in picks[common:]:
+            self.pick(name, team, position)
+
+    def recommendations(self):
+        """
+        For the team picking next, the best balance still reachable after
+        picking each available player (and position).
+        """
+        team = self.next_team
+        if team is None:
+            return []
+
+        available = set(self.available)
+        best = {}
+        for diff, _, _, side_a, side_b, _ in self._candidates:
+            for name, position in (side_a if team == 'A' else side_b):
+                if name in available and (name, position) not in best:
+                    best[(name, position)] = diff
+
+        return sorted(({'name': name, 'position': position, 'bestDiff': diff}
+                       for (name, position), diff in best.items()),
+                      key=lambda r: r['bestDiff'])
+
+    def to_token(self, secret_key):
+        return _serializer(secret_key).dumps({
+            'players': self.players,
+            'usePositions': self.use_positions,
+            'useRecentPerformance': self.use_recent_performance,
+            'strengthKey': self.strength_key,
+            'picks': self.picks
+        })
+
+    def state(self, secret_key):
+        diff, strength_a, strength_b, side_a, side_b, _ = self._candidates[0]
+        expected_a = head_to_head_expected(strength_a, strength_b)
+        recommendations = self.recommendations()
+        return {
+            'token': self.to_token(secret_key),
+            'teamA': [{'name': n, 'position': p} for n, p in self.team_a],
+            'teamB': [{'name': n, 'position': p} for n, p in self.team_b],
+            'available': self.available,
+            'nextTeam': self.next_team,
+            'recommendedPick': recommendations[0] if recommendations else None,
+            'recommendations': recommendations,
+            'bestBalance': {
+                'teamA': [{'name': n, 'position': p} for n, p in side_a],
+                'teamB': [{'name': n, 'position': p} for n, p in side_b],
+                'teamAStrength': strength_a,
+                'teamBStrength': strength_b,
+                'difference': diff,
+                'expectedA': expected_a
+            },
+            'complete': self.next_team is None,
+            'usePositions': self.use_positions,
+            'useRecentPerformance': self.use_recent_performance
+        }
+
+def _serializer(secret_key):
+    return URLSafeSerializer(secret_key, salt='captain-draft')
+
+def _pool_key(players, use_positions, use_recent_performance, strength_key):
+    payload = json.dumps([players, use_positions, use_recent_performance, strength_key], sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def _cached_session(players, use_positions, use_recent_performance, strength_key):
+    """
+    The built session for a pool and options, building it on a miss
+    """
+    key = _pool_key(players, use_positions, use_recent_performance, strength_key)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is not None:
+            _sessions.move_to_end(key)
+            return session
+
+    # Build outside the lock; if another request built the same one first, use theirs
+    session = DraftSession(players, use_positions, use_recent_performance, strength_key)
+    with _sessions_lock:
+        session = _sessions.setdefault(key, session)
+        _sessions.move_to_end(key)
+        while len(_sessions) > MAX_SESSIONS:
+            _sessions.popitem(last=False)
+    return session
+
+def start_draft(metrics_list, secret_key, locked_a=None, locked_b=None, use_positions=False,
+                use_recent_performance=False, strength_key='weighted_average'):
+    """
+    Start a draft, applying any locked assignments (lists of {'name',
+    'position'} dicts) as picks.
+
+    Returns:
+        dict: The draft state, including its token
+    """
+    players = [{k: m[k] for k in DRAFT_FIELDS if k in m} for m in metrics_list]
+    picks = [(player['name'], team, player.get('position'))
+             for team, locked in (('A', locked_a or []), ('B', locked_b or []))
+             for player in locked]
+
+    session = _cached_session(players, use_positions, use_recent_performance, strength_key)
+    with session.lock:
+        session.replay([])
+        for name, team, position in picks:
+            session.pick(name, team, position)
+        return session.state(secret_key)
+
+def _load_draft(token, secret_key):
+    if not token:
+        return None, None
+    try:
+        data = _serializer(secret_key).loads(token)
+    except BadSignature:
+        return None, None
+    session = _cached_session(data['players'], data['usePositions'], data['useRecentPerformance'],
+                              data['strengthKey'])
+    return session, data['picks']
+
+def draft_pick(token, secret_key, name, team=None, position=None):
+    """
+    Make a pick in the draft a token describes. The team defaults to the
+    one picking next.
+
+    Returns:
+        dict: The new draft state, or None if the token isn't valid
+    """
+    session, picks = _load_draft(token, secret_key)
+    if session is None:
+        return None
+    with session.lock:
+        session.replay(picks)
+        session.pick(name, team or session.next_team or '', position)
+        return session.state(secret_key)
+
+def draft_undo(token, secret_key):
+    """
+    Take back the last pick in the draft a token describes.
+
+    Returns:
+        dict: The new draft state, or None if the token isn't valid
+    """
+    session, picks = _load_draft(token, secret_key)
+    if session is None:
+        return None
+    with session.lock:
+        session.replay(picks)
+        session.undo()
+        return session.state(secret_key)
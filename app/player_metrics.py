@@ -0,0 +1,131 @@
+"""
+Player list and the per-player metrics served by the web app and stored in
+warm-state snapshots. Kept apart from the routes so the snapshot builder
+doesn't import the web layer.
+"""
+from app.result_cache import data_version
+from app.team_comparison import calculate_metrics, extract_player_id
+from getPositionMultipliers import get_position_metrics_from_csv
+from match_statistics import get_recent_match_statistics
+from rating_engine import get_rating_engine, rating_metrics
+
+PLAYERS = [
+    {
+        "name": "Saltik",
+        "url": "https://www.aoe2insights.com/user/13028522/elo-history/3/"
+    },
+    {
+        "name": "Eren",
+        "url": "https://www.aoe2insights.com/user/2471692/elo-history/3/"
+    },
+    {
+        "name": "Sencer",
+        "url": "https://www.aoe2insights.com/user/3915596/elo-history/3/"
+    },
+    {
+        "name": "Dinc",
+        "url": "https://www.aoe2insights.com/user/4970559/elo-history/3/"
+    },
+    {
+        "name": "Salim",
+        "url": "https://www.aoe2insights.com/user/1444557/elo-history/3/"
+    },
+    {
+        "name": "Emre",
+        "url": "https://www.aoe2insights.com/user/2079039/elo-history/3/"
+    },
+    {
+        "name": "Kaan",
+        "url": "https://www.aoe2insights.com/user/12397390/elo-history/3/"
+    },
+    {
+        "name": "Hakan",
+        "url": "https://www.aoe2insights.com/user/1528769/elo-history/3/"
+    },
+    {
+        "name": "JR",
+        "url": "https://www.aoe2insights.com/user/2943236/elo-history/3/"
+    },
+    {
+        "name": "Yahya",
+        "url": "https://www.aoe2insights.com/user/3138965/elo-history/3/"
+    },
+    {
+        "name": "Kursad",
+        "url": "https://www.aoe2insights.com/user/3545515/elo-history/3/"
+    },
+    {
+        "name": "Kuzen",
+        "url": "https://www.aoe2insights.com/user/3778162/elo-history/3/"
+    }
+]
+
+def player_metrics_from_history(player, raw_data, filter_types):
+    """
+    Metrics for each filter type from one fetched Elo history, as
+    {filter type: metrics}. Filters with no history in range map to None.
+    """
+    history = [{"date": date, "elo": elo} for date, elo in raw_data.items()]
+    player_id = extract_player_id(player['url'])
+    match_metrics = None
+    
+    metrics_by_filter = {}
+    for filter_type in filter_types:
+        metrics = calculate_metrics(history, filter_type)
+        if metrics:
+            metrics['name'] = player['name']
+            metrics['player_id'] = player_id
+            
+            # The match stats don't depend on the filter
+            if match_metrics is None:
+                match_metrics = {}
+                add_match_metrics(match_metrics, player_id)
+            metrics.update(match_metrics)
+            
+            metrics['data_version'] = data_version(metrics)
+        metrics_by_filter[filter_type] = metrics
+    return metrics_by_filter
+
+def add_match_metrics(metrics, player_id):
+    """
+    Add position and recent performance stats from the match CSV and the
+    player's team rating to their metrics
+    """
+    # Get position metrics
+    position_data = get_position_metrics_from_csv(player_id)
+    
+    # Get recent match statistics
+    match_stats = get_recent_match_statistics(player_id)
+    
+    if position_data:
+        metrics.update({
+            'flank_multiplier': position_data['flank_multiplier'],
+            'pocket_multiplier': position_data['pocket_multiplier'],
+            'flank_matches': position_data['flank_matches'],
+            'pocket_matches': position_data['pocket_matches'],
+            'flank_winrate': position_data['flank_winrate'],
+            'pocket_winrate': position_data['pocket_winrate']
+        })
+    
+    if match_stats:
+        metrics.update({
+            'recent_matches': match_stats['total_matches'],
+            'recent_winrate': match_stats['win_rate'],
+            'recent_performance_multiplier': match_stats['recent_performance_multiplier']
+        })
+    
+    # Rating from our own recorded team games
+    engine = get_rating_engine()
+    metrics['team_rating'] = engine.rating(player_id)
+    metrics['team_rating_games'] = engine.games(player_id)
+
+def rating_only_metrics(player):
+    """
+    Metrics for a player built from the team rating engine and the match CSV
+    alone, without fetching their Elo history
+    """
+    player_id = extract_player_id(player['url'])
+    metrics = rating_metrics(player_id, player['name'])
+    add_match_metrics(metrics, player_id)
+    metrics['data_version'] = data_version(metrics)
+    return metrics
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Metric fields that feed the team calculations. Cached results are keyed
+# on these values rather than on a client-supplied data_version, so metrics
+# sent with a stale or forged version can't hit or poison the cache.
+VERSION_FIELDS = ('player_id', 'weighted_average', 'arithmetic_mean', 'current_elo', 'max_elo',
+                  'min_elo', 'trend', 'avg_elo', 'median_elo', 'flank_multiplier', 'pocket_multiplier',
+                  'recent_performance_multiplier', 'team_rating')
+
+class ResultCache:
+    """
+    Bounded LRU cache with a time-to-live for computed results.
+    """
+
+    def __init__(self, max_entries=256, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """
+        Get a cached value, or None if it is missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """
+        Drop every cached result
+        """
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+def data_version(metrics):
+    """
+    Digest of a player's metrics, stored with them when they are fetched so
+    a refresh can tell when the underlying data has changed.
+    """
+    payload = json.dumps(metrics, sort_keys=True, default=str).encode()
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+def player_version(metrics):
+    return tuple(metrics.get(field) for field in VERSION_FIELDS)
+
+def roster_signature(players, metrics_by_name, use_positions=False):
+    """
+    Canonical, order-independent signature of a roster: each player's name,
+    position (when positions are used) and the metric values the team
+    calculations use.
+
+    Args:
+        players (list): Player names, or dicts with 'name' and 'position'
+        metrics_by_name (dict): Player name -> metrics
+        use_positions (bool): Whether positions are part of the signature
+    """
+    signature = []
+    for player in players:
+        if isinstance(player, dict):
+            name, position = player['name'], player.get('position')
+        else:
+            name, position = player, None
+        signature.append((name, position if use_positions else None,
+                          player_version(metrics_by_name[name])))
+    return tuple(sorted(signature, key=lambda s: (s[0], s[1] or '')))
+
+result_cache = ResultCache()
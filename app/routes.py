@@ -1,112 +1,211 @@
-from flask import render_template, jsonify, request
-from app import app
-from app.team_comparison import (fetch_json, calculate_metrics, calculate_team_strength,
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from flask import Flask, render_template, jsonify, request
+from app import template_dir, static_dir
+from app.team_comparison import (fetch_json, calculate_team_strength,
                                head_to_head_expected, find_best_team_combination,
-                               calculate_series_probabilities)
-from getPositionMultipliers import get_position_metrics, get_position_metrics_from_csv  
-from match_statistics import get_recent_match_statistics
-
-PLAYERS = [
-    {
-        "name": "Saltik",
-        "url": "https://www.aoe2insights.com/user/13028522/elo-history/3/"
-    },
-    {
-        "name": "Eren",
-        "url": "https://www.aoe2insights.com/user/2471692/elo-history/3/"
-    },
-    {
-        "name": "Sencer",
-        "url": "https://www.aoe2insights.com/user/3915596/elo-history/3/"
-    },
-    {
-        "name": "Dinc",
-        "url": "https://www.aoe2insights.com/user/4970559/elo-history/3/"
-    },
-    {
-        "name": "Salim",
-        "url": "https://www.aoe2insights.com/user/1444557/elo-history/3/"
-    },
-    {
-        "name": "Emre",
-        "url": "https://www.aoe2insights.com/user/2079039/elo-history/3/"
-    },
-    {
-        "name": "Kaan",
-        "url": "https://www.aoe2insights.com/user/12397390/elo-history/3/"
-    },
-    {
-        "name": "Hakan",
-        "url": "https://www.aoe2insights.com/user/1528769/elo-history/3/"
-    },
-    {
-        "name": "JR",
-        "url": "https://www.aoe2insights.com/user/2943236/elo-history/3/"
-    },
-    {
-        "name": "Yahya",
-        "url": "https://www.aoe2insights.com/user/3138965/elo-history/3/"
-    },
-    {
-        "name": "Kursad",
-        "url": "https://www.aoe2insights.com/user/3545515/elo-history/3/"
-    },
-    {
-        "name": "Kuzen",
-        "url": "https://www.aoe2insights.com/user/3778162/elo-history/3/"
-    }
-]
+                               calculate_series_probabilities, extract_player_id)
+from app.player_metrics import PLAYERS, player_metrics_from_history, rating_only_metrics
+from app.draft import start_draft, draft_pick as make_draft_pick, draft_undo as undo_draft_pick
+from app.result_cache import result_cache, roster_signature
+from app.snapshot import load_snapshot, FILTER_TYPES
+from getPositionMultipliers import get_position_metrics
+from match_cube import get_match_cube, set_match_cube, refresh_match_cube, get_map_multiplier, ALL
+from rating_engine import get_rating_engine, set_rating_engine, update_ratings
+
+app = Flask('app',
+            template_folder=template_dir,
+            static_folder=static_dir)
+
+# Signs captain draft tokens, so it must be the same on every instance.
+# The draft endpoints refuse to run without it.
+app.secret_key = os.environ.get('SECRET_KEY')
+
+# Overall time budget for /get_player_metrics, in seconds
+METRICS_DEADLINE = 8
+
+# Fetches for user requests; sized so a few overlapping requests don't
+# queue behind each other's hung fetches. The background refresh has its
+# own pool so it never holds up a request.
+_fetch_executor = ThreadPoolExecutor(max_workers=len(PLAYERS) * 4)
+_refresh_executor = ThreadPoolExecutor(max_workers=len(PLAYERS))
+
+# Last successfully fetched metrics per (player name, filter type)
+_last_good_metrics = {}
+
+# Derived state mapped from the warm-state snapshot, if one was built. It
+# answers /get_player_metrics until a live refresh of that filter completes.
+_warm_state = load_snapshot()
+_live_filters = set()
+_refresh_started = False
+_refresh_lock = threading.Lock()
+
+# A refresh that leaves filters on snapshot data is retried after a backoff
+# that doubles with each failure, up to the maximum (seconds)
+REFRESH_BACKOFF = 30
+REFRESH_BACKOFF_MAX = 600
+_refresh_failures = 0
+_refresh_retry_at = 0
+
+if _warm_state is not None:
+    set_match_cube(_warm_state.match_cube())
+    set_rating_engine(_warm_state.rating_engine())
+
+# Player metric each strength source combines into team strength
+STRENGTH_KEYS = {
+    'ladder': 'weighted_average',
+    'team_rating': 'team_rating'
+}
 
 @app.route('/')
 def index():
-    return render_template('index.html', players=PLAYERS)
+    return render_template('index.html', players=PLAYERS, maps=sorted(get_match_cube().maps))
+
+def find_player_id(name):
+    player = next((p for p in PLAYERS if p['name'] == name), None)
+    return extract_player_id(player['url']) if player else None
+
+def get_strength_key(data, metrics_list):
+    """
+    Metric to use as player strength for a request, filling in team ratings
+    for any players whose metrics don't carry one yet
+    """
+    strength_key = STRENGTH_KEYS.get(data.get('strengthSource', 'ladder'), 'weighted_average')
+    if strength_key == 'team_rating':
+        engine = get_rating_engine()
+        for metrics in metrics_list:
+            if 'team_rating' not in metrics:
+                player_id = metrics.get('player_id') or find_player_id(metrics['name'])
+                metrics['team_rating'] = engine.rating(player_id) if player_id else engine.initial_rating
+    return strength_key
+
+def load_player_metrics(player, filter_types, deadline=None):
+    raw_data = fetch_json(player['url'], deadline=deadline)
+    return player_metrics_from_history(player, raw_data, filter_types)
 
-def extract_player_id(url):
-    # Extract ID from URL like "https://www.aoe2insights.com/user/13028522/elo-history/3/"
-    parts = url.split('/')
-    return int(parts[4])
+def with_rating_only_metrics(data, all_metrics, names):
+    """
+    With the team_rating strength source, players the request has no metrics
+    for are rated from the team rating engine alone, so teams can be
+    compared, balanced and drafted without loading player metrics first
+    """
+    if data.get('strengthSource') != 'team_rating':
+        return all_metrics
+    known = {m['name'] for m in all_metrics}
+    return all_metrics + [rating_only_metrics(p) for p in PLAYERS
+                          if p['name'] in names and p['name'] not in known]
+
+def collect_player_metrics(filter_types, executor=_fetch_executor):
+    """
+    Fetch every player's history once within METRICS_DEADLINE and return
+    {filter type: metrics for every player}. Players that fail are served
+    from their last good metrics (or the warm-state snapshot) flagged as
+    stale, or marked missing.
+    """
+    deadline = time.monotonic() + METRICS_DEADLINE
+    
+    # Fetch all players at once; the shared pool lets us answer at the
+    # deadline without waiting for hung fetches to finish
+    futures = [(player, executor.submit(load_player_metrics, player, filter_types, deadline))
+               for player in PLAYERS]
+    
+    players_metrics = {filter_type: [] for filter_type in filter_types}
+    refreshed = False
+    for player, future in futures:
+        try:
+            metrics_by_filter = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except Exception as e:
+            error = str(e) if not isinstance(e, FuturesTimeoutError) else "Timed out"
+            error = f"Error fetching data for {player['name']}: {error}"
+            for filter_type in filter_types:
+                stale = _last_good_metrics.get((player['name'], filter_type))
+                if stale is None and _warm_state is not None:
+                    stale = _warm_state.player_metrics(player['name'], filter_type)
+                    if stale is not None:
+                        stale = snapshot_row(stale)
+                if stale is not None:
+                    # Serve the last good metrics, flagged as stale
+                    players_metrics[filter_type].append(dict(stale, stale=True, error=error))
+                else:
+                    players_metrics[filter_type].append({'name': player['name'], 'missing': True,
+                                                         'error': error})
+            continue
+        
+        for filter_type, metrics in metrics_by_filter.items():
+            if metrics:
+                cache_key = (player['name'], filter_type)
+                previous = _last_good_metrics.get(cache_key)
+                if previous is not None and previous.get('data_version') != metrics['data_version']:
+                    refreshed = True
+                _last_good_metrics[cache_key] = metrics
+                players_metrics[filter_type].append(metrics)
+    
+    if refreshed:
+        # Cached results are keyed by metric values, so the old ones can
+        # never be hit again; drop them instead of waiting for them to age out
+        result_cache.invalidate()
+    
+    return players_metrics
+
+def snapshot_row(metrics):
+    """
+    Flag metrics served from the warm-state snapshot, with when it was built
+    """
+    return dict(metrics, stale=True, snapshot=True, snapshot_built_at=_warm_state.built_at)
+
+def refresh_warm_state():
+    """
+    Bring everything loaded from the snapshot up to date: rebuild the match
+    cube and ratings from the CSV, then fetch each player's history once and
+    compute live metrics for every filter still served from the snapshot.
+    If any filter is left on snapshot data the refresh is allowed again
+    after a backoff.
+    """
+    global _refresh_started, _refresh_failures, _refresh_retry_at
+    try:
+        refresh_match_cube()
+        update_ratings()
+        pending = [f for f in FILTER_TYPES if f not in _live_filters]
+        if pending:
+            collected = collect_player_metrics(pending, _refresh_executor)
+            for filter_type, players_metrics in collected.items():
+                if not all(m.get('missing') or m.get('stale') for m in players_metrics):
+                    _live_filters.add(filter_type)
+    finally:
+        with _refresh_lock:
+            if len(_live_filters) < len(FILTER_TYPES):
+                _refresh_failures += 1
+                backoff = min(REFRESH_BACKOFF_MAX, REFRESH_BACKOFF * 2 ** (_refresh_failures - 1))
+                _refresh_retry_at = time.monotonic() + backoff
+            else:
+                _refresh_failures = 0
+            _refresh_started = False
+
+def start_background_refresh():
+    global _refresh_started
+    with _refresh_lock:
+        if _refresh_started or time.monotonic() < _refresh_retry_at:
+            return
+        _refresh_started = True
+    threading.Thread(target=refresh_warm_state, daemon=True).start()
 
 @app.route('/get_player_metrics', methods=['POST'])
 def get_player_metrics():
     data = request.get_json()
     filter_type = data.get('filterType', 'all')
     
-    players_metrics = []
-    for player in PLAYERS:
-        try:
-            raw_data = fetch_json(player['url'])
-            history = [{"date": date, "elo": elo} for date, elo in raw_data.items()]
-            metrics = calculate_metrics(history, filter_type)
-            if metrics:
-                metrics['name'] = player['name']
-                
-                # Get position metrics
-                player_id = extract_player_id(player['url'])
-                position_data = get_position_metrics_from_csv(player_id)
-                
-                # Get recent match statistics
-                match_stats = get_recent_match_statistics(player_id)
-                
-                if position_data:
-                    metrics.update({
-                        'flank_multiplier': position_data['flank_multiplier'],
-                        'pocket_multiplier': position_data['pocket_multiplier'],
-                        'flank_matches': position_data['flank_matches'],
-                        'pocket_matches': position_data['pocket_matches'],
-                        'flank_winrate': position_data['flank_winrate'],
-                        'pocket_winrate': position_data['pocket_winrate']
-                    })
-                
-                if match_stats:
-                    metrics.update({
-                        'recent_matches': match_stats['total_matches'],
-                        'recent_winrate': match_stats['win_rate'],
-                        'recent_performance_multiplier': match_stats['recent_performance_multiplier']
-                    })
-                
-                players_metrics.append(metrics)
-        except Exception as e:
-            return jsonify({'error': f"Error fetching data for {player['name']}: {str(e)}"}), 500
+    if _warm_state is not None and filter_type not in _live_filters:
+        warm_metrics = _warm_state.all_player_metrics(filter_type)
+        if warm_metrics:
+            start_background_refresh()
+            return jsonify([snapshot_row(m) for m in warm_metrics])
+    
+    players_metrics = collect_player_metrics([filter_type])[filter_type]
+    
+    if all(m.get('missing') for m in players_metrics):
+        return jsonify({'error': "Could not fetch data for any player, please try again later"}), 503
     
     return jsonify(players_metrics)
 
@@ -115,9 +214,25 @@ def compare_teams():
     data = request.get_json()
     team_a = data.get('teamA', [])
     team_b = data.get('teamB', [])
-    all_metrics = data.get('allMetrics', [])
+    all_metrics = with_rating_only_metrics(data, data.get('allMetrics', []),
+                                           [p['name'] for p in team_a + team_b])
     use_positions = data.get('usePositions', False)
     use_recent_performance = data.get('useRecentPerformance', False)
+    use_map_stats = data.get('useMapStats', False)
+    map_name = data.get('map', 'Arabia')
+    
+    strength_key = get_strength_key(data, all_metrics)
+    
+    metrics_by_name = {m['name']: m for m in all_metrics}
+    cache_key = ('compare',
+                 roster_signature(team_a, metrics_by_name, use_positions),
+                 roster_signature(team_b, metrics_by_name, use_positions),
+                 use_positions, use_recent_performance, strength_key,
+                 # The cube's row count changes whenever new matches are added
+                 (map_name, len(get_match_cube())) if use_map_stats else None)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
     
     def get_team_metrics(team_players):
         adjusted_metrics = []
@@ -126,12 +241,17 @@ def compare_teams():
             adjusted = metrics.copy()
             
             if use_positions:
-                position_mult = metrics[f"{player['position']}_multiplier"]
-                adjusted['weighted_average'] *= position_mult if position_mult else 1
+                position_mult = metrics.get(f"{player['position']}_multiplier")
+                adjusted[strength_key] *= position_mult if position_mult else 1
                 
             if use_recent_performance:
                 perf_mult = metrics.get('recent_performance_multiplier', 1.0)
-                adjusted['weighted_average'] *= perf_mult
+                adjusted[strength_key] *= perf_mult
+                
+            if use_map_stats:
+                player_id = metrics.get('player_id') or find_player_id(player['name'])
+                position = player.get('position') if use_positions else None
+                adjusted[strength_key] *= get_map_multiplier(player_id, map_name, position)
                 
             adjusted_metrics.append(adjusted)
         return adjusted_metrics
@@ -139,48 +259,103 @@ def compare_teams():
     team_a_metrics = get_team_metrics(team_a)
     team_b_metrics = get_team_metrics(team_b)
     
-    team_a_strength = calculate_team_strength(team_a_metrics)
-    team_b_strength = calculate_team_strength(team_b_metrics)
+    team_a_strength = calculate_team_strength(team_a_metrics, strength_key)
+    team_b_strength = calculate_team_strength(team_b_metrics, strength_key)
     
     expected_a = head_to_head_expected(team_a_strength["weighted_average"],
                                      team_b_strength["weighted_average"])
     series_probs = calculate_series_probabilities(expected_a)
     
-    return jsonify({
+    result = {
         'teamAStrength': team_a_strength,
         'teamBStrength': team_b_strength,
         'expectedA': expected_a,
         'seriesProbabilities': series_probs,
         'usePositions': use_positions,
-        'useRecentPerformance': use_recent_performance
+        'useRecentPerformance': use_recent_performance,
+        'useMapStats': use_map_stats,
+        'map': map_name if use_map_stats else None,
+        'strengthSource': data.get('strengthSource', 'ladder')
+    }
+    result_cache.put(cache_key, result)
+    return jsonify(result)
+
+@app.route('/match_stats', methods=['POST'])
+def match_stats():
+    data = request.get_json()
+    player_id = data.get('playerId')
+    player_name = data.get('player')
+    if player_id is None and player_name:
+        player_id = find_player_id(player_name)
+        if player_id is None:
+            return jsonify({'error': f"Unknown player: {player_name}"}), 404
+    
+    days = data.get('days')
+    try:
+        player_id = int(player_id) if player_id is not None else None
+        days = int(days) if days is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': "playerId and days must be whole numbers"}), 400
+    if days is not None and days < 0:
+        return jsonify({'error': "days can't be negative"}), 400
+    
+    stats = get_match_cube().query(
+        player_id if player_id is not None else ALL,
+        data.get('map') or ALL,
+        data.get('civ') or ALL,
+        data.get('position') or ALL,
+        days=days
+    )
+    stats.update({
+        'player': player_name,
+        'playerId': player_id,
+        'map': data.get('map'),
+        'civ': data.get('civ'),
+        'position': data.get('position'),
+        'days': days
     })
+    return jsonify(stats)
 
 @app.route('/find_balanced_teams', methods=['POST'])
 def find_balanced_teams():
     data = request.get_json()
     selected_players = data.get('selectedPlayers', [])
-    all_metrics = data.get('allMetrics', [])
+    all_metrics = with_rating_only_metrics(data, data.get('allMetrics', []), selected_players)
     use_positions = data.get('usePositions', False)
     use_recent_performance = data.get('useRecentPerformance', False)
     
-    selected_metrics = [m for m in all_metrics if m['name'] in selected_players]
+    # Sorted by name so the same pool always gives the same teams
+    selected_metrics = sorted((m for m in all_metrics if m['name'] in selected_players),
+                              key=lambda m: m['name'])
     player_names = [m['name'] for m in selected_metrics]
+    strength_key = get_strength_key(data, selected_metrics)
     
-    best_teams = find_best_team_combination(
-        selected_metrics, 
-        player_names,
-        use_positions=use_positions,
-        use_recent_performance=use_recent_performance
-    )
+    cache_key = ('balance',
+                 roster_signature(player_names, {m['name']: m for m in selected_metrics}),
+                 use_positions, use_recent_performance, strength_key)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+    
+    try:
+        best_teams = find_best_team_combination(
+            selected_metrics, 
+            player_names,
+            use_positions=use_positions,
+            use_recent_performance=use_recent_performance,
+            strength_key=strength_key
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Calculate win probabilities and series probabilities
-    team_a_strength = calculate_team_strength(best_teams[4])  # New return value from find_best_team_combination
-    team_b_strength = calculate_team_strength(best_teams[5])  # New return value from find_best_team_combination
+    team_a_strength = calculate_team_strength(best_teams[4], strength_key)  # New return value from find_best_team_combination
+    team_b_strength = calculate_team_strength(best_teams[5], strength_key)  # New return value from find_best_team_combination
     expected_a = head_to_head_expected(team_a_strength["weighted_average"],
                                      team_b_strength["weighted_average"])
     series_probs = calculate_series_probabilities(expected_a)
     
-    return jsonify({
+    result = {
         'teamA': best_teams[0],
         'teamB': best_teams[1],
         'teamAStrength': team_a_strength,
@@ -188,4 +363,73 @@ def find_balanced_teams():
         'expectedA': expected_a,
         'seriesProbabilities': series_probs,
         'positions': best_teams[3] if use_positions else None
-    })
+    }
+    result_cache.put(cache_key, result)
+    return jsonify(result)
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+@app.route('/draft/start', methods=['POST'])
+def draft_start():
+    data = request.get_json()
+    selected_players = data.get('selectedPlayers', [])
+    all_metrics = with_rating_only_metrics(data, data.get('allMetrics', []), selected_players)
+    
+    selected_metrics = [m for m in all_metrics if m['name'] in selected_players]
+    
+    if not app.secret_key:
+        return draft_unavailable()
+    
+    try:
+        state = start_draft(
+            selected_metrics,
+            app.secret_key,
+            locked_a=data.get('teamA', []),
+            locked_b=data.get('teamB', []),
+            use_positions=data.get('usePositions', False),
+            use_recent_performance=data.get('useRecentPerformance', False),
+            strength_key=get_strength_key(data, selected_metrics)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(state)
+
+@app.route('/draft/pick', methods=['POST'])
+def draft_pick():
+    data = request.get_json()
+    if not app.secret_key:
+        return draft_unavailable()
+    
+    try:
+        state = make_draft_pick(data.get('token'), app.secret_key, data.get('name'),
+                                data.get('team'), data.get('position'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if state is None:
+        return jsonify({'error': 'Draft token is invalid, please start a new draft'}), 400
+    return jsonify(state)
+
+@app.route('/draft/undo', methods=['POST'])
+def draft_undo():
+    data = request.get_json()
+    if not app.secret_key:
+        return draft_unavailable()
+    
+    try:
+        state = undo_draft_pick(data.get('token'), app.secret_key)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if state is None:
+        return jsonify({'error': 'Draft token is invalid, please start a new draft'}), 400
+    return jsonify(state)
+
+def draft_unavailable():
+    # Draft tokens are signed with SECRET_KEY; a per-process key would make
+    # every other instance reject them
+    return jsonify({'error': "Captain draft needs the SECRET_KEY environment variable "
+                             "(the same value on every instance)"}), 503
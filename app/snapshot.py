@@ -0,0 +1,239 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime, timezone
+
+from app.player_metrics import PLAYERS, player_metrics_from_history
+from app.team_comparison import fetch_json
+from match_cube import MatchCube, ALL, get_match_cube, refresh_match_cube
+from rating_engine import TeamRatingEngine, get_rating_engine, update_ratings
+
+SNAPSHOT_PATH = os.environ.get(
+    'WARM_STATE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'warm_state.snap'))
+# Snapshots older than this many seconds aren't used
+SNAPSHOT_MAX_AGE = float(os.environ.get('WARM_STATE_MAX_AGE', 7 * 24 * 3600))
+
+# File layout:
+#   header  magic, format version, index offset, index length
+#   arrays  raw int64/float64 arrays in the builder's byte order, 8-byte aligned
+#   index   JSON describing the state; arrays are referenced as
+#           {"offset", "length", "type"} and read in place from the mapping
+MAGIC = b'KHWARM\0\0'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIxxxxQQ')
+
+FILTER_TYPES = ('2025', '2024-2025', 'all')
+
+class _ArrayWriter:
+    def __init__(self, f):
+        self.f = f
+
+    def add(self, values, typecode):
+        data = array(typecode, values)
+        offset = self.f.tell()
+        data.tofile(self.f)
+        return {'offset': offset, 'length': len(data), 'type': typecode}
+
+def write_snapshot(path, players_state, cube, engine):
+    """
+    Write derived state to a snapshot file (atomically).
+
+    Args:
+        path (str): Output file
+        players_state (dict): player name -> {'history_dates', 'history_elos',
+            'metrics': {filter type: metrics}}
+        cube (MatchCube): Match cube to store the prefix sums of
+        engine (TeamRatingEngine): Rating engine to store the state of
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0))
+        writer = _ArrayWriter(f)
+
+        players_index = {}
+        for name, state in players_state.items():
+            metrics_index = {}
+            for filter_type, metrics in state['metrics'].items():
+                if metrics is None:
+                    continue
+                scalars = {k: v for k, v in metrics.items() if k != 'elos'}
+                metrics_index[filter_type] = {
+                    'scalars': scalars,
+                    'elos': writer.add(metrics['elos'], 'd')
+                }
+            players_index[name] = {
+                'history_dates': writer.add(state['history_dates'], 'd'),
+                'history_elos': writer.add(state['history_elos'], 'd'),
+                'metrics': metrics_index
+            }
+
+        # All cube cells share three arrays; each cell records where its slice starts
+        cells = []
+        days, cum_matches, cum_wins = [], [], []
+        for key, (cell_days, cell_matches, cell_wins) in cube.prefixes():
+            cells.append([list(key), len(days), len(cum_matches), len(cell_days)])
+            days.extend(cell_days)
+            cum_matches.extend(cell_matches)
+            cum_wins.extend(cell_wins)
+        cube_index = {
+            'cells': cells,
+            'days': writer.add(days, 'q'),
+            'cum_matches': writer.add(cum_matches, 'q'),
+            'cum_wins': writer.add(cum_wins, 'q'),
+            'latest_day': cube.latest_day,
+            'maps': sorted(cube.maps),
+            'civs': sorted(cube.civs),
+            'rows': len(cube)
+        }
+
+        index = json.dumps({
+            'built_at': datetime.now(timezone.utc).isoformat(),
+            'byteorder': sys.byteorder,
+            'players': players_index,
+            'match_cube': cube_index,
+            'ratings': engine.to_dict()
+        }).encode()
+        index_offset = f.tell()
+        f.write(index)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, index_offset, len(index)))
+    os.replace(tmp_path, path)
+
+class WarmState:
+    """
+    Read-only view of a snapshot file. The file is memory-mapped and only the
+    JSON index is parsed; history arrays and cube prefix sums are read in
+    place from the mapping.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+
+        magic, version, index_offset, index_length = HEADER.unpack_from(self._buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a warm-state snapshot")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version} (expected {FORMAT_VERSION})")
+
+        index = json.loads(self._buffer[index_offset:index_offset + index_length].tobytes())
+        if index['byteorder'] != sys.byteorder:
+            raise ValueError(f"Snapshot was built on a {index['byteorder']}-endian machine")
+        self.path = path
+        self.built_at = index['built_at']
+        self._players = index['players']
+        self._cube_index = index['match_cube']
+        self._ratings = index['ratings']
+
+    def _array(self, ref):
+        # Every array holds 8-byte items
+        start = ref['offset']
+        return self._buffer[start:start + ref['length'] * 8].cast(ref['type'])
+
+    @property
+    def age(self):
+        """
+        Seconds since the snapshot was built
+        """
+        return (datetime.now(timezone.utc) - datetime.fromisoformat(self.built_at)).total_seconds()
+
+    @property
+    def match_rows(self):
+        """
+        Number of match CSV rows the stored cube was built from
+        """
+        return self._cube_index['rows']
+
+    @property
+    def player_names(self):
+        return list(self._players)
+
+    def history(self, name):
+        """
+        (dates as UTC timestamps, elos) arrays for a player
+        """
+        player = self._players[name]
+        return self._array(player['history_dates']), self._array(player['history_elos'])
+
+    def player_metrics(self, name, filter_type):
+        """
+        Metrics for a player and filter type as /get_player_metrics returns
+        them, or None if the snapshot doesn't have them
+        """
+        entry = self._players.get(name, {}).get('metrics', {}).get(filter_type)
+        if entry is None:
+            return None
+        metrics = dict(entry['scalars'])
+        metrics['elos'] = self._array(entry['elos']).tolist()
+        return metrics
+
+    def all_player_metrics(self, filter_type):
+        metrics = [self.player_metrics(name, filter_type) for name in self._players]
+        return [m for m in metrics if m is not None] or None
+
+    def match_cube(self):
+        index = self._cube_index
+        days = self._array(index['days'])
+        cum_matches = self._array(index['cum_matches'])
+        cum_wins = self._array(index['cum_wins'])
+        prefixes = {}
+        for key, days_start, cum_start, n in index['cells']:
+            player_id = key[0] if key[0] == ALL else int(key[0])
+            prefixes[(player_id, key[1], key[2], key[3])] = (
+                days[days_start:days_start + n],
+                cum_matches[cum_start:cum_start + n + 1],
+                cum_wins[cum_start:cum_start + n + 1]
+            )
+        return MatchCube.from_prefixes(prefixes, index['latest_day'], index['maps'],
+                                       index['civs'], index['rows'])
+
+    def rating_engine(self):
+        return TeamRatingEngine.from_dict(self._ratings)
+
+def load_snapshot(path=SNAPSHOT_PATH, max_age=SNAPSHOT_MAX_AGE):
+    """
+    Map a snapshot file, or return None if there isn't a usable one or it
+    is more than max_age seconds old
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        state = WarmState(path)
+    except Exception as e:
+        print(f"Error loading warm-state snapshot {path}: {str(e)}")
+        return None
+    if state.age > max_age:
+        print(f"Ignoring warm-state snapshot {path}: built {state.built_at}, older than {max_age:.0f}s")
+        return None
+    return state
+
+def build_snapshot(path=SNAPSHOT_PATH):
+    """
+    Fetch every player and compute all derived state, then write a snapshot
+    """
+    refresh_match_cube()
+    update_ratings()
+
+    players_state = {}
+    for player in PLAYERS:
+        try:
+            raw_data = fetch_json(player['url'])
+        except Exception as e:
+            print(f"Error fetching data for {player['name']}: {str(e)}", file=sys.stderr)
+            continue
+
+        history = sorted(raw_data.items())
+        players_state[player['name']] = {
+            'history_dates': [datetime.fromisoformat(date.replace('Z', '+00:00')).timestamp()
+                              for date, _ in history],
+            'history_elos': [float(elo) for _, elo in history],
+            'metrics': player_metrics_from_history(player, raw_data, FILTER_TYPES)
+        }
+
+    write_snapshot(path, players_state, get_match_cube(), get_rating_engine())
+    return len(players_state)
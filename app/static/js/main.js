@@ -1,11 +1,15 @@
 let playerMetrics = [];
 let currentMode = null;
+let draftToken = null;
 
 $(document).ready(function() {
     $('#loadData').click(loadPlayerData);
     $('#compareTeams').click(() => setMode('compare'));
     $('#findBalanced').click(() => setMode('balanced'));
+    $('#captainDraft').click(() => setMode('draft'));
     $('#calculateResults, #calculateBalancedResults').click(calculateResults);
+    $('#startDraft').click(startDraft);
+    $('#undoDraftPick').click(undoDraftPick);
     
     // Automatically load data when page loads
     loadPlayerData();
@@ -24,7 +28,8 @@ function loadPlayerData() {
         contentType: 'application/json',
         data: JSON.stringify({ filterType: filterValue }),
         success: function(data) {
-            playerMetrics = data;
+            playerMetrics = data.filter(p => !p.missing);
+            showFetchWarnings(data);
             displayMetricsTable();
             $('#modeSelection').show();
             // Hide loading indicator
@@ -40,6 +45,26 @@ function loadPlayerData() {
     });
 }
 
+function showFetchWarnings(data) {
+    const missing = data.filter(p => p.missing).map(p => p.name);
+    const stale = data.filter(p => p.stale && !p.snapshot).map(p => p.name);
+    const snapshot = data.filter(p => p.snapshot);
+    const warnings = [];
+    
+    if (snapshot.length) {
+        const builtAt = new Date(snapshot[0].snapshot_built_at).toLocaleString();
+        warnings.push(`Showing saved data from ${builtAt} for: ${snapshot.map(p => p.name).join(', ')}`);
+    }
+    if (stale.length) {
+        warnings.push(`Showing older data for: ${stale.join(', ')}`);
+    }
+    if (missing.length) {
+        warnings.push(`Could not load: ${missing.join(', ')}`);
+    }
+    
+    $('#fetchWarnings').html(warnings.join('<br>')).toggle(warnings.length > 0);
+}
+
 function displayMetricsTable() {
     if ($.fn.DataTable.isDataTable('#metricsTable')) {
         $('#metricsTable').DataTable().destroy();
@@ -57,6 +82,7 @@ function displayMetricsTable() {
             { data: 'max_elo', render: formatNumber },
             { data: 'avg_elo', render: formatNumber },
             { data: 'median_elo', render: formatNumber },
+            { data: 'team_rating', render: (data) => data ? formatNumber(data) : 'N/A' },
             { data: 'recent_matches', render: (data) => data || 'N/A' },
             { data: 'recent_winrate', render: (data) => data ? data.toFixed(1) + '%' : 'N/A' },
             { data: 'recent_performance_multiplier', render: (data) => data ? data.toFixed(3) : 'N/A' },
@@ -82,6 +108,8 @@ function setMode(mode) {
     // Hide all mode-specific divs first
     $('#teamSelection').hide();
     $('#balancedTeamsSelection').hide();
+    $('#draftSelection').hide();
+    $('#draftBoard').hide();
     
     // Clear and hide results
     $('#resultsContent').empty();
@@ -93,6 +121,9 @@ function setMode(mode) {
     } else if (mode === 'balanced') {
         $('#balancedTeamsSelection').show();
         setupBalancedTeamSelector();
+    } else if (mode === 'draft') {
+        $('#draftSelection').show();
+        setupDraftSelector();
     }
 }
 
@@ -135,6 +166,11 @@ function setupTeamSelectors() {
     $('#usePositions').change(function() {
         $('.position-select').toggle(this.checked);
     });
+
+    // Handle map toggle
+    $('#useMapStats').change(function() {
+        $('#mapSelect').toggle(this.checked);
+    });
 }
 
 function setupBalancedTeamSelector() {
@@ -153,10 +189,112 @@ function setupBalancedTeamSelector() {
     select.attr('multiple', 'multiple');
 }
 
+function setupDraftSelector() {
+    const select = $('#draftPlayersSelect');
+    select.empty();
+    
+    playerMetrics.forEach(player => {
+        select.append($('<option>', {
+            value: player.name,
+            text: player.name
+        }));
+    });
+}
+
+function startDraft() {
+    const selectedPlayers = $('#draftPlayersSelect').val();
+    
+    if (selectedPlayers.length !== 8) {
+        alert('Please select exactly 8 players');
+        return;
+    }
+    
+    $.ajax({
+        url: '/draft/start',
+        method: 'POST',
+        contentType: 'application/json',
+        data: JSON.stringify({
+            selectedPlayers,
+            allMetrics: playerMetrics,
+            usePositions: $('#usePositionsDraft').is(':checked'),
+            useRecentPerformance: $('#useRecentPerformanceDraft').is(':checked'),
+            strengthSource: $('#strengthSource').val()
+        }),
+        success: function(data) {
+            $('#draftSelection').hide();
+            displayDraft(data);
+        },
+        error: function(xhr) {
+            alert('Error starting draft: ' + xhr.responseJSON.error);
+        }
+    });
+}
+
+function draftPick(name, position) {
+    $.ajax({
+        url: '/draft/pick',
+        method: 'POST',
+        contentType: 'application/json',
+        data: JSON.stringify({ token: draftToken, name, position }),
+        success: displayDraft,
+        error: function(xhr) {
+            alert('Error making pick: ' + xhr.responseJSON.error);
+        }
+    });
+}
+
+function undoDraftPick() {
+    $.ajax({
+        url: '/draft/undo',
+        method: 'POST',
+        contentType: 'application/json',
+        data: JSON.stringify({ token: draftToken }),
+        success: displayDraft,
+        error: function(xhr) {
+            alert('Error undoing pick: ' + xhr.responseJSON.error);
+        }
+    });
+}
+
+function displayDraft(data) {
+    draftToken = data.token;
+    const playerItem = player => `<li>${player.name}${player.position ? ` (${player.position})` : ''}</li>`;
+    $('#draftTeamA').html(data.teamA.map(playerItem).join(''));
+    $('#draftTeamB').html(data.teamB.map(playerItem).join(''));
+    
+    const picks = $('#draftPicks').empty();
+    if (data.complete) {
+        picks.append('<p>Draft complete.</p>');
+    } else {
+        picks.append(`<h5>Team ${data.nextTeam} to pick</h5>`);
+        data.recommendations.forEach((option, i) => {
+            const label = `${option.name}${option.position ? ` (${option.position})` : ''}` +
+                ` &ndash; best difference ${formatNumber(option.bestDiff)}`;
+            $(`<button class="btn ${i === 0 ? 'btn-success' : 'btn-outline-primary'} me-2 mb-2">${label}</button>`)
+                .click(() => draftPick(option.name, option.position))
+                .appendTo(picks);
+        });
+    }
+    
+    const best = data.bestBalance;
+    const teamList = team => team.map(p => `${p.name}${p.position ? ` (${p.position})` : ''}`).join(', ');
+    $('#draftBestBalance').html(`
+        <h5>${data.complete ? 'Final Teams' : 'Best Achievable Balance'}</h5>
+        <p>Team A: ${teamList(best.teamA)} &ndash; Strength: ${formatNumber(best.teamAStrength)}</p>
+        <p>Team B: ${teamList(best.teamB)} &ndash; Strength: ${formatNumber(best.teamBStrength)}</p>
+        <p>Team A win probability: ${(best.expectedA * 100).toFixed(1)}%</p>
+        <p>Team B win probability: ${((1 - best.expectedA) * 100).toFixed(1)}%</p>
+    `);
+    
+    $('#undoDraftPick').prop('disabled', data.teamA.length + data.teamB.length === 0);
+    $('#draftBoard').show();
+}
+
 function calculateResults() {
     if (currentMode === 'compare') {
         const usePositions = $('#usePositions').is(':checked');
         const useRecentPerformance = $('#useRecentPerformance').is(':checked');
+        const useMapStats = $('#useMapStats').is(':checked');
         
         // Get teams data
         const teamA = $('#teamAContainer .player-selection').map(function() {
@@ -212,7 +350,10 @@ function calculateResults() {
                 teamB,
                 allMetrics: playerMetrics,
                 usePositions: usePositions,
-                useRecentPerformance: useRecentPerformance
+                useRecentPerformance: useRecentPerformance,
+                strengthSource: $('#strengthSource').val(),
+                useMapStats: useMapStats,
+                map: $('#mapSelect').val()
             }),
             success: displayResults,
             error: function(xhr) {
@@ -237,7 +378,8 @@ function calculateResults() {
                 selectedPlayers,
                 allMetrics: playerMetrics,
                 usePositions,
-                useRecentPerformance
+                useRecentPerformance,
+                strengthSource: $('#strengthSource').val()
             }),
             success: displayBalancedResults,
             error: function(xhr) {
@@ -1,17 +1,28 @@
-import requests
+"""
+Team strength calculations shared by the web app and the command line.
+
+Run the interactive comparison from the project root with:
+
+    python -m app.team_comparison
+"""
+import json
 from datetime import datetime
 from itertools import combinations, permutations
+from statistics import median
 
-def fetch_json(url):
+import upstream
+
+def fetch_json(url, deadline=None):
     """
     Fetch JSON data from a URL.
+    Uses timeouts, retries and circuit breaking; gives up at the deadline
+    (a time.monotonic() value) if one is given.
     """
-    response = requests.get(url)
-    response.raise_for_status()
+    content = upstream.fetch(url, deadline=deadline)
     # Add debug print to see raw response
     #print(f"Response from {url}:")
-    #print(response.text[:500])  # Print first 500 chars to avoid overwhelming output
-    return response.json()
+    #print(content[:500])  # Print first 500 chars to avoid overwhelming output
+    return json.loads(content)
 
 def calculate_metrics(history, filter_type='all'):
 
@@ -67,18 +78,43 @@ def head_to_head_expected(elo_A, elo_B):
     expected_A = 1 / (1 + 10 ** ((elo_B - elo_A) / 400))
     return expected_A
 
-def calculate_team_strength(metrics_list):
+def adjusted_strength(metrics, position=None, use_positions=False, use_recent_performance=False,
+                      strength_key='weighted_average'):
+    """
+    A player's strength (weighted average Elo unless strength_key says
+    otherwise) with the optional position and recent performance
+    multipliers applied.
+    """
+    strength = metrics[strength_key]
+    if use_positions and position:
+        mult = metrics.get(f"{position}_multiplier")
+        strength *= mult if mult else 1
+    if use_recent_performance:
+        strength *= metrics.get('recent_performance_multiplier', 1.0)
+    return strength
+
+def weighted_team_elo(strengths):
+    """
+    Combine player strengths into a team strength, weighting each player
+    by their own strength so stronger players count for more.
+    """
+    total_weight = sum(strengths)
+    if total_weight == 0:
+        return 0
+    return sum(s * s for s in strengths) / total_weight
+
+def calculate_team_strength(metrics_list, strength_key='weighted_average'):
     """
     Calculate team strength based on multiple players' metrics.
     Returns average values for the team's metrics.
+    strength_key picks the player metric combined into the team's
+    weighted_average, e.g. 'team_rating' to use the team rating engine.
     """
     if not metrics_list:
         return None
     
     # Calculate weighted average of players' weighted averages
-    total_weighted_elo = sum(m["weighted_average"] * m["weighted_average"] for m in metrics_list)
-    total_weight = sum(m["weighted_average"] for m in metrics_list)
-    team_weighted_average = total_weighted_elo / total_weight if total_weight != 0 else 0
+    team_weighted_average = weighted_team_elo([m[strength_key] for m in metrics_list])
     
     team_metrics = {
         "arithmetic_mean": sum(m["arithmetic_mean"] for m in metrics_list) / len(metrics_list),
@@ -88,66 +124,68 @@ def calculate_team_strength(metrics_list):
         "trend": sum(m["trend"] for m in metrics_list) / len(metrics_list),
         "min_elo": min(m["min_elo"] for m in metrics_list),
         "avg_elo": sum(m["avg_elo"] for m in metrics_list) / len(metrics_list),
-        "median_elo": sorted(m["elos"] for m in metrics_list)[len(metrics_list) // 2]
+        # Median of the players' own medians; per-player summaries keep this
+        # independent of how long each Elo history is
+        "median_elo": median(m["median_elo"] for m in metrics_list)
     }
     return team_metrics
 
-def find_best_team_combination(metrics_list, player_names, use_positions=False, use_recent_performance=False):
+def position_assignments(team_size, use_positions=True):
+    """
+    Distinct ways to assign positions to a team, half flank and the rest
+    pocket, or a single all-None assignment when positions aren't used
+    """
+    if not use_positions:
+        return [(None,) * team_size]
+    slots = ['flank'] * (team_size // 2) + ['pocket'] * (team_size - team_size // 2)
+    return list(dict.fromkeys(permutations(slots, team_size)))
+
+def find_best_team_combination(metrics_list, player_names, use_positions=False, use_recent_performance=False,
+                               strength_key='weighted_average'):
+    # Team A always has 4 players; team B gets everyone else
+    if len(metrics_list) < 5:
+        raise ValueError("At least 5 players are needed to find balanced teams")
+    
     best_diff = float('inf')
-    best_teams = None
-    best_positions = None
+    best_split = None
+    
+    # Each player's adjusted strength only depends on their position, so work
+    # it out once per player and position instead of once per combination
+    positions = ['flank', 'pocket'] if use_positions else [None]
+    strengths = [{position: adjusted_strength(m, position, use_positions, use_recent_performance, strength_key)
+                  for position in positions}
+                 for m in metrics_list]
+    
+    # If using positions, try different position combinations
+    # (duplicate orderings of the flanks/pockets are skipped)
+    positions_a = position_assignments(4, use_positions)
+    positions_b = position_assignments(len(metrics_list) - 4, use_positions)
     
     for team_a in combinations(range(len(metrics_list)), 4):
-        team_b = list(set(range(len(metrics_list))) - set(team_a))
+        team_b = [i for i in range(len(metrics_list)) if i not in team_a]
+        
+        team_b_options = [(pos_b, weighted_team_elo([strengths[i][p] for i, p in zip(team_b, pos_b)]))
+                          for pos_b in positions_b]
         
-        # If using positions, try different position combinations
-        if use_positions:
-            positions_a = list(permutations(['flank', 'flank', 'pocket', 'pocket'], 4))
-            positions_b = list(permutations(['flank', 'flank', 'pocket', 'pocket'], 4))
-        else:
-            positions_a = [None]
-            positions_b = [None]
-            
         for pos_a in positions_a:
-            for pos_b in positions_b:
-                team_a_metrics = []
-                team_b_metrics = []
-                
-                # Process team A
-                for i, player_idx in enumerate(team_a):
-                    adjusted = metrics_list[player_idx].copy()
-                    if use_positions and pos_a:
-                        mult = adjusted[f"{pos_a[i]}_multiplier"]
-                        adjusted['weighted_average'] *= mult if mult else 1
-                    if use_recent_performance:
-                        perf_mult = adjusted.get('recent_performance_multiplier', 1.0)
-                        adjusted['weighted_average'] *= perf_mult
-                    team_a_metrics.append(adjusted)
-                
-                # Process team B
-                for i, player_idx in enumerate(team_b):
-                    adjusted = metrics_list[player_idx].copy()
-                    if use_positions and pos_b:
-                        mult = adjusted[f"{pos_b[i]}_multiplier"]
-                        adjusted['weighted_average'] *= mult if mult else 1
-                    if use_recent_performance:
-                        perf_mult = adjusted.get('recent_performance_multiplier', 1.0)
-                        adjusted['weighted_average'] *= perf_mult
-                    team_b_metrics.append(adjusted)
-                
-                team_a_strength = calculate_team_strength(team_a_metrics)
-                team_b_strength = calculate_team_strength(team_b_metrics)
-                
-                diff = abs(team_a_strength['weighted_average'] - team_b_strength['weighted_average'])
+            team_a_strength = weighted_team_elo([strengths[i][p] for i, p in zip(team_a, pos_a)])
+            
+            for pos_b, team_b_strength in team_b_options:
+                diff = abs(team_a_strength - team_b_strength)
                 
                 if diff < best_diff:
                     best_diff = diff
-                    team_a_names = [{'name': player_names[i], 'position': pos_a[j] if pos_a else None} 
-                                  for j, i in enumerate(team_a)]
-                    team_b_names = [{'name': player_names[i], 'position': pos_b[j] if pos_b else None} 
-                                  for j, i in enumerate(team_b)]
-                    best_teams = (team_a_names, team_b_names)
-                    best_positions = {'teamA': pos_a, 'teamB': pos_b} if use_positions else None
+                    best_split = (team_a, team_b, pos_a, pos_b)
+    
+    team_a, team_b, pos_a, pos_b = best_split
+    team_a_names = [{'name': player_names[i], 'position': pos_a[j]} for j, i in enumerate(team_a)]
+    team_b_names = [{'name': player_names[i], 'position': pos_b[j]} for j, i in enumerate(team_b)]
+    best_teams = (team_a_names, team_b_names)
+    best_positions = {'teamA': pos_a, 'teamB': pos_b} if use_positions else None
+    
+    # Adjusted metrics for the chosen teams
+    team_a_metrics = [dict(metrics_list[i], **{strength_key: strengths[i][pos_a[j]]}) for j, i in enumerate(team_a)]
+    team_b_metrics = [dict(metrics_list[i], **{strength_key: strengths[i][pos_b[j]]}) for j, i in enumerate(team_b)]
     
     expected_win_rate = 0.5  # For balanced teams
     return (best_teams[0], best_teams[1], expected_win_rate, best_positions, 
@@ -175,25 +213,32 @@ def calculate_series_probabilities(p_win):
         "0-3": p_0_3
     }
 
+# Player names and URLs for the players' Elo histories
+PLAYERS = [
+    ("Saltik", "https://www.aoe2insights.com/user/13028522/elo-history/3/"),
+    #("Saltik2", "https://www.aoe2insights.com/user/2739525/elo-history/3/"), #Lanchester
+    ("Eren", "https://www.aoe2insights.com/user/2471692/elo-history/3/"),
+    ("Sencer", "https://www.aoe2insights.com/user/3915596/elo-history/3/"),
+    ("Dinc", "https://www.aoe2insights.com/user/4970559/elo-history/3/"),
+    ("Salim", "https://www.aoe2insights.com/user/1444557/elo-history/3/"),
+    ("Emre", "https://www.aoe2insights.com/user/2079039/elo-history/3/"),
+    ("Kaan", "https://www.aoe2insights.com/user/12397390/elo-history/3/"),
+    ("Hakan", "https://www.aoe2insights.com/user/1528769/elo-history/3/"),
+    ("JR", "https://www.aoe2insights.com/user/2943236/elo-history/3/"),
+    ("Yahya", "https://www.aoe2insights.com/user/3138965/elo-history/3/"),
+    ("Kursad", "https://www.aoe2insights.com/user/3545515/elo-history/3/"),
+    ("Kuzen", "https://www.aoe2insights.com/user/3778162/elo-history/3/"),
+    ("Mustafa", "https://www.aoe2insights.com/user/5094125/elo-history/3/"),
+    ("Berkay", "https://www.aoe2insights.com/user/1491145/elo-history/3/")
+]
+
+def extract_player_id(url):
+    # Extract ID from URL like "https://www.aoe2insights.com/user/13028522/elo-history/3/"
+    parts = url.split('/')
+    return int(parts[4])
+
 def main():
-    # Player names and URLs for the eight players' Elo histories
-    players = [
-        ("Saltik", "https://www.aoe2insights.com/user/13028522/elo-history/3/"),
-        #("Saltik2", "https://www.aoe2insights.com/user/2739525/elo-history/3/"), #Lanchester
-        ("Eren", "https://www.aoe2insights.com/user/2471692/elo-history/3/"),
-        ("Sencer", "https://www.aoe2insights.com/user/3915596/elo-history/3/"),
-        ("Dinc", "https://www.aoe2insights.com/user/4970559/elo-history/3/"),
-        ("Salim", "https://www.aoe2insights.com/user/1444557/elo-history/3/"),
-        ("Emre", "https://www.aoe2insights.com/user/2079039/elo-history/3/"),
-        ("Kaan", "https://www.aoe2insights.com/user/12397390/elo-history/3/"),
-        ("Hakan", "https://www.aoe2insights.com/user/1528769/elo-history/3/"),
-        ("JR", "https://www.aoe2insights.com/user/2943236/elo-history/3/"),
-        ("Yahya", "https://www.aoe2insights.com/user/3138965/elo-history/3/"),
-        ("Kursad", "https://www.aoe2insights.com/user/3545515/elo-history/3/"),
-        ("Kuzen", "https://www.aoe2insights.com/user/3778162/elo-history/3/"),
-        ("Mustafa", "https://www.aoe2insights.com/user/5094125/elo-history/3/"),
-        ("Berkay", "https://www.aoe2insights.com/user/1491145/elo-history/3/")
-    ]
+    players = PLAYERS
     
     # Ask user if they want to use filtered data
     use_filtered_data = input("Do you want to use only 2024 and 2025 data? (yes/no): ").strip().lower() == 'yes'
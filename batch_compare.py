@@ -0,0 +1,268 @@
+"""
+Evaluate many team comparison scenarios in one run and stream the results
+to stdout as JSON lines.
+
+    python batch_compare.py scenarios.json --workers 4 --cache-dir elo_cache
+
+See load_scenarios for the scenario file format.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from app.team_comparison import (PLAYERS, fetch_json, calculate_metrics, adjusted_strength,
+                                 calculate_team_strength, find_best_team_combination,
+                                 head_to_head_expected, calculate_series_probabilities,
+                                 extract_player_id)
+from getPositionMultipliers import get_position_metrics_from_csv
+from match_statistics import get_recent_match_statistics
+from rating_engine import load_rating_engine, rating_metrics
+
+def load_scenarios(path):
+    """
+    Load batch scenarios from a JSON or CSV file.
+
+    JSON files hold a list of scenario objects (or {"scenarios": [...]}):
+        {"id": "s1", "filter": "2025", "usePositions": true, "useRecentPerformance": false,
+         "teamA": [{"name": "Kaan", "position": "flank"}, ...], "teamB": [...]}
+        {"id": "s2", "filter": "all", "pool": ["Kaan", "Eren", ...], "strengthSource": "team_rating"}
+
+    CSV files use the columns id, filter, teamA, teamB, pool, usePositions,
+    useRecentPerformance and strengthSource, with players separated by ";" and an optional
+    ":position" suffix, e.g. "Kaan:flank;Eren:pocket".
+    """
+    if path.lower().endswith('.csv'):
+        scenarios = []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                scenario = {
+                    'id': row.get('id'),
+                    'filter': row.get('filter') or 'all',
+                    'usePositions': (row.get('usePositions') or '').strip().lower() in ('1', 'true', 'yes'),
+                    'useRecentPerformance': (row.get('useRecentPerformance') or '').strip().lower() in ('1', 'true', 'yes'),
+                    'strengthSource': row.get('strengthSource') or 'ladder'
+                }
+                for key in ('teamA', 'teamB', 'pool'):
+                    if row.get(key):
+                        scenario[key] = [
+                            dict(zip(('name', 'position'), entry.strip().split(':', 1)))
+                            for entry in row[key].split(';') if entry.strip()
+                        ]
+                if 'pool' in scenario:
+                    scenario['pool'] = [p['name'] for p in scenario['pool']]
+                scenarios.append(scenario)
+        return scenarios
+
+    with open(path) as f:
+        data = json.load(f)
+    return data['scenarios'] if isinstance(data, dict) else data
+
+def _scenario_players(scenario):
+    names = list(scenario.get('pool', []))
+    for key in ('teamA', 'teamB'):
+        names += [p['name'] if isinstance(p, dict) else p for p in scenario.get(key, [])]
+    return names
+
+def load_player_histories(names, players=PLAYERS, cache_dir=None, offline=False, fixtures=None):
+    """
+    Get the raw Elo history for each distinct player, fetching each one at
+    most once. Fixture data and the cache directory are used before the
+    network; with offline=True the network is never used.
+
+    Returns:
+        dict: player name -> raw history ({date: elo}), missing players omitted
+    """
+    urls = dict(players)
+    histories = {}
+    to_fetch = []
+
+    for name in set(names):
+        if fixtures and name in fixtures:
+            histories[name] = fixtures[name]
+            continue
+        cache_path = os.path.join(cache_dir, f"{name}.json") if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                histories[name] = json.load(f)
+        elif offline:
+            print(f"Warning: No cached data for {name}", file=sys.stderr)
+        elif name not in urls:
+            print(f"Warning: Unknown player {name}", file=sys.stderr)
+        else:
+            to_fetch.append(name)
+
+    def fetch(name):
+        try:
+            return name, fetch_json(urls[name])
+        except Exception as e:
+            print(f"Error fetching data for {name}: {str(e)}", file=sys.stderr)
+            return name, None
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for name, data in executor.map(fetch, to_fetch):
+            if data is None:
+                continue
+            histories[name] = data
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(os.path.join(cache_dir, f"{name}.json"), 'w') as f:
+                    json.dump(data, f)
+
+    return histories
+
+def build_player_metrics(histories, filter_types, players=PLAYERS, rating_names=()):
+    """
+    Calculate metrics for every player and filter type, including the
+    position and recent performance multipliers from the match CSV.
+    Players in rating_names (those in team_rating scenarios) without a
+    history get metrics from their team rating alone.
+
+    Returns:
+        dict: (player name, filter type) -> metrics
+    """
+    # Ratings are only needed for team_rating scenarios. The engine is
+    # built in memory and never checkpointed from here.
+    engine = load_rating_engine() if rating_names else None
+
+    urls = dict(players)
+    extra = {}
+    for name in set(histories) | set(rating_names):
+        extra[name] = {}
+        if name not in urls:
+            continue
+        player_id = extract_player_id(urls[name])
+        position_data = get_position_metrics_from_csv(player_id)
+        match_stats = get_recent_match_statistics(player_id)
+        if position_data:
+            extra[name].update(position_data)
+        if match_stats:
+            extra[name]['recent_performance_multiplier'] = match_stats['recent_performance_multiplier']
+        if engine is not None:
+            extra[name]['team_rating'] = engine.rating(player_id)
+
+    metrics_table = {}
+    for name, raw_data in histories.items():
+        history = [{"date": date, "elo": elo} for date, elo in raw_data.items()]
+        if not history:
+            continue
+        for filter_type in filter_types:
+            metrics = calculate_metrics(history, filter_type)
+            metrics['name'] = name
+            metrics.update(extra[name])
+            metrics_table[(name, filter_type)] = metrics
+
+    for name in set(rating_names) - set(histories):
+        if name not in urls:
+            continue
+        player_id = extract_player_id(urls[name])
+        for filter_type in filter_types:
+            metrics = rating_metrics(player_id, name, engine)
+            metrics.update(extra[name])
+            metrics_table[(name, filter_type)] = metrics
+    return metrics_table
+
+_batch_metrics = None
+
+def _init_batch_worker(metrics_table):
+    global _batch_metrics
+    _batch_metrics = metrics_table
+
+def evaluate_scenario(scenario):
+    """
+    Evaluate a single batch scenario against the worker's metrics table.
+    """
+    result = {'id': scenario.get('id')}
+    try:
+        filter_type = scenario.get('filter', 'all')
+        use_positions = scenario.get('usePositions', False)
+        use_recent_performance = scenario.get('useRecentPerformance', False)
+        strength_key = 'team_rating' if scenario.get('strengthSource') == 'team_rating' else 'weighted_average'
+
+        def player_metrics(name):
+            metrics = _batch_metrics.get((name, filter_type))
+            if metrics is None:
+                raise ValueError(f"No data for {name}")
+            return metrics
+
+        def team_metrics(team):
+            adjusted_metrics = []
+            for player in team:
+                if not isinstance(player, dict):
+                    player = {'name': player}
+                adjusted = player_metrics(player['name']).copy()
+                adjusted[strength_key] = adjusted_strength(
+                    adjusted, player.get('position'), use_positions, use_recent_performance, strength_key)
+                adjusted_metrics.append(adjusted)
+            return adjusted_metrics
+
+        if scenario.get('pool'):
+            pool = scenario['pool']
+            best_teams = find_best_team_combination(
+                [player_metrics(name) for name in pool], pool,
+                use_positions=use_positions,
+                use_recent_performance=use_recent_performance,
+                strength_key=strength_key
+            )
+            team_a, team_b = best_teams[0], best_teams[1]
+        else:
+            team_a = scenario.get('teamA', [])
+            team_b = scenario.get('teamB', [])
+
+        team_a_strength = calculate_team_strength(team_metrics(team_a), strength_key)
+        team_b_strength = calculate_team_strength(team_metrics(team_b), strength_key)
+        expected_a = head_to_head_expected(team_a_strength["weighted_average"],
+                                         team_b_strength["weighted_average"])
+        result.update({
+            'teamA': team_a,
+            'teamB': team_b,
+            'teamAStrength': team_a_strength["weighted_average"],
+            'teamBStrength': team_b_strength["weighted_average"],
+            'expectedA': expected_a,
+            'seriesProbabilities': calculate_series_probabilities(expected_a)
+        })
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+def batch_main(args):
+    """
+    Evaluate every scenario in a file and stream JSON-lines results to stdout
+    """
+    scenarios = load_scenarios(args.scenarios)
+    players = PLAYERS
+    if args.players:
+        with open(args.players) as f:
+            players = [(p['name'], p['url']) for p in json.load(f)]
+    fixtures = None
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            fixtures = json.load(f)
+
+    # Players only in team_rating scenarios are rated without fetching anything
+    names = [name for scenario in scenarios if scenario.get('strengthSource') != 'team_rating'
+             for name in _scenario_players(scenario)]
+    rating_names = {name for scenario in scenarios if scenario.get('strengthSource') == 'team_rating'
+                    for name in _scenario_players(scenario)}
+    histories = load_player_histories(names, players, args.cache_dir, args.offline, fixtures)
+    filter_types = {scenario.get('filter', 'all') for scenario in scenarios}
+    metrics_table = build_player_metrics(histories, filter_types, players, rating_names)
+
+    chunksize = max(1, len(scenarios) // ((args.workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_batch_worker,
+                             initargs=(metrics_table,)) as executor:
+        for result in executor.map(evaluate_scenario, scenarios, chunksize=chunksize):
+            sys.stdout.write(json.dumps(result) + "\n")
+            sys.stdout.flush()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate team comparison scenarios in bulk.")
+    parser.add_argument('scenarios', help="JSON or CSV file of scenarios to evaluate")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes")
+    parser.add_argument('--cache-dir', help="Directory to read and store fetched Elo histories")
+    parser.add_argument('--offline', action='store_true', help="Never fetch, only use cached or fixture data")
+    parser.add_argument('--fixtures', help="JSON file mapping player names to raw Elo histories")
+    parser.add_argument('--players', help="JSON list of {name, url} to use instead of the built-in players")
+    batch_main(parser.parse_args())
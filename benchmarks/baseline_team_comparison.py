@@ -0,0 +1,93 @@
+"""
+calculate_team_strength and find_best_team_combination exactly as they were
+in app/team_comparison.py at commit 4cc4219, before the per-player summary
+and balancer changes. bench_team_strength.py times the current versions
+against these; don't edit them.
+"""
+from itertools import combinations, permutations
+
+def calculate_team_strength(metrics_list):
+    """
+    Calculate team strength based on multiple players' metrics.
+    Returns average values for the team's metrics.
+    """
+    if not metrics_list:
+        return None
+    
+    # Calculate weighted average of players' weighted averages
+    total_weighted_elo = sum(m["weighted_average"] * m["weighted_average"] for m in metrics_list)
+    total_weight = sum(m["weighted_average"] for m in metrics_list)
+    team_weighted_average = total_weighted_elo / total_weight if total_weight != 0 else 0
+    
+    team_metrics = {
+        "arithmetic_mean": sum(m["arithmetic_mean"] for m in metrics_list) / len(metrics_list),
+        "weighted_average": team_weighted_average,
+        "max_elo": max(m["max_elo"] for m in metrics_list),
+        "current_elo": sum(m["current_elo"] for m in metrics_list) / len(metrics_list),
+        "trend": sum(m["trend"] for m in metrics_list) / len(metrics_list),
+        "min_elo": min(m["min_elo"] for m in metrics_list),
+        "avg_elo": sum(m["avg_elo"] for m in metrics_list) / len(metrics_list),
+        "median_elo": sorted(m["elos"] for m in metrics_list)[len(metrics_list) // 2]
+    }
+    return team_metrics
+
+def find_best_team_combination(metrics_list, player_names, use_positions=False, use_recent_performance=False):
+    best_diff = float('inf')
+    best_teams = None
+    best_positions = None
+    
+    for team_a in combinations(range(len(metrics_list)), 4):
+        team_b = list(set(range(len(metrics_list))) - set(team_a))
+        
+        # If using positions, try different position combinations
+        if use_positions:
+            positions_a = list(permutations(['flank', 'flank', 'pocket', 'pocket'], 4))
+            positions_b = list(permutations(['flank', 'flank', 'pocket', 'pocket'], 4))
+        else:
+            positions_a = [None]
+            positions_b = [None]
+            
+        for pos_a in positions_a:
+            for pos_b in positions_b:
+                team_a_metrics = []
+                team_b_metrics = []
+                
+                # Process team A
+                for i, player_idx in enumerate(team_a):
+                    adjusted = metrics_list[player_idx].copy()
+                    if use_positions and pos_a:
+                        mult = adjusted[f"{pos_a[i]}_multiplier"]
+                        adjusted['weighted_average'] *= mult if mult else 1
+                    if use_recent_performance:
+                        perf_mult = adjusted.get('recent_performance_multiplier', 1.0)
+                        adjusted['weighted_average'] *= perf_mult
+                    team_a_metrics.append(adjusted)
+                
+                # Process team B
+                for i, player_idx in enumerate(team_b):
+                    adjusted = metrics_list[player_idx].copy()
+                    if use_positions and pos_b:
+                        mult = adjusted[f"{pos_b[i]}_multiplier"]
+                        adjusted['weighted_average'] *= mult if mult else 1
+                    if use_recent_performance:
+                        perf_mult = adjusted.get('recent_performance_multiplier', 1.0)
+                        adjusted['weighted_average'] *= perf_mult
+                    team_b_metrics.append(adjusted)
+                
+                team_a_strength = calculate_team_strength(team_a_metrics)
+                team_b_strength = calculate_team_strength(team_b_metrics)
+                
+                diff = abs(team_a_strength['weighted_average'] - team_b_strength['weighted_average'])
+                
+                if diff < best_diff:
+                    best_diff = diff
+                    team_a_names = [{'name': player_names[i], 'position': pos_a[j] if pos_a else None} 
+                                  for j, i in enumerate(team_a)]
+                    team_b_names = [{'name': player_names[i], 'position': pos_b[j] if pos_b else None} 
+                                  for j, i in enumerate(team_b)]
+                    best_teams = (team_a_names, team_b_names)
+                    best_positions = {'teamA': pos_a, 'teamB': pos_b} if use_positions else None
+    
+    expected_win_rate = 0.5  # For balanced teams
+    return (best_teams[0], best_teams[1], expected_win_rate, best_positions, 
+            team_a_metrics, team_b_metrics)
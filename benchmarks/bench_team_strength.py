@@ -0,0 +1,81 @@
+"""
+Benchmark team aggregation and the team balancer against the baseline
+implementation (benchmarks/baseline_team_comparison.py, copied verbatim
+from commit 4cc4219), for increasingly long Elo histories.
+
+    python benchmarks/bench_team_strength.py
+
+The balancer is timed three ways: the baseline, the baseline loop calling
+the current calculate_team_strength, and the current balancer. The middle
+column shows how much of the speedup the aggregation change accounts for.
+"""
+import os
+import random
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import baseline_team_comparison as baseline
+from app.team_comparison import calculate_team_strength, find_best_team_combination
+
+HISTORY_LENGTHS = (100, 1000, 10000)
+# The baseline balancer only handles 8 players
+PLAYER_COUNT = 8
+
+def fake_metrics(name, history_length, rng):
+    elos = [rng.randint(800, 1600) for _ in range(history_length)]
+    ordered = sorted(elos)
+    return {
+        'name': name,
+        'arithmetic_mean': sum(elos) / len(elos),
+        'weighted_average': sum(elos[-20:]) / len(elos[-20:]),
+        'max_elo': max(elos),
+        'current_elo': elos[-1],
+        'trend': elos[-1] - elos[0],
+        'min_elo': min(elos),
+        'avg_elo': sum(elos) / len(elos),
+        'median_elo': ordered[len(ordered) // 2],
+        'flank_multiplier': rng.uniform(0.95, 1.05),
+        'pocket_multiplier': rng.uniform(0.95, 1.05),
+        'recent_performance_multiplier': rng.uniform(0.95, 1.05),
+        'elos': elos
+    }
+
+def timed(func, *args, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args)
+    return (time.perf_counter() - start) / repeat, result
+
+def main():
+    rng = random.Random(42)
+    print("Team aggregation (calculate_team_strength, 4 players)")
+    print(f"{'history':>8} {'baseline':>11} {'current':>11}")
+    pools = []
+    for history_length in HISTORY_LENGTHS:
+        metrics = [fake_metrics(f"P{i}", history_length, rng) for i in range(PLAYER_COUNT)]
+        pools.append((history_length, metrics))
+
+        strength_old, _ = timed(baseline.calculate_team_strength, metrics[:4], repeat=20000)
+        strength_new, _ = timed(calculate_team_strength, metrics[:4], repeat=20000)
+        print(f"{history_length:>8} {strength_old * 1e6:>9.2f}us {strength_new * 1e6:>9.2f}us")
+
+    print()
+    print(f"Balancer (find_best_team_combination, {PLAYER_COUNT} players, positions and recent performance)")
+    print(f"{'history':>8} {'baseline':>11} {'+ new agg':>11} {'current':>11} {'speedup':>8} {'same teams':>11}")
+    for history_length, metrics in pools:
+        names = [m['name'] for m in metrics]
+
+        balancer_old, old_result = timed(baseline.find_best_team_combination, metrics, names, True, True)
+        with mock.patch.object(baseline, 'calculate_team_strength', calculate_team_strength):
+            balancer_mixed, _ = timed(baseline.find_best_team_combination, metrics, names, True, True)
+        balancer_new, new_result = timed(find_best_team_combination, metrics, names, True, True, repeat=20)
+
+        same = old_result[:2] == new_result[:2]
+        print(f"{history_length:>8} {balancer_old * 1e3:>9.1f}ms {balancer_mixed * 1e3:>9.1f}ms "
+              f"{balancer_new * 1e3:>9.1f}ms {balancer_old / balancer_new:>7.0f}x {str(same):>11}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Check the upstream client's timeouts, retries and circuit breaker against a
+local stub server that hangs, drips its body a byte at a time or fails.
+
+    python benchmarks/upstream_stub.py
+
+Timeouts are shortened so the whole run takes a few seconds. Exits non-zero
+if any check fails.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import upstream
+
+BODY = json.dumps({f"2025-01-{day:02d}T10:00:00Z": 1000 + day for day in range(1, 28)}).encode()
+
+# What /switch answers with; lets a check make a path fail and then recover
+SWITCH = {'mode': 'ok'}
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        mode = self.path.strip('/').split('/')[-1]
+        if mode == 'switch':
+            mode = SWITCH['mode']
+
+        if mode == 'hang':
+            time.sleep(60)
+            return
+        if mode in ('500', '404'):
+            self.send_response(int(mode))
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        if mode == 'drip':
+            for byte in BODY:
+                try:
+                    self.wfile.write(bytes([byte]))
+                    self.wfile.flush()
+                    time.sleep(0.2)
+                except OSError:
+                    return
+        else:
+            self.wfile.write(BODY)
+
+def start_stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def timed_fetch(url, **kwargs):
+    start = time.monotonic()
+    try:
+        upstream.fetch(url, **kwargs)
+        outcome = 'ok'
+    except Exception as e:
+        outcome = type(e).__name__
+    return outcome, time.monotonic() - start
+
+def main():
+    upstream.READ_TIMEOUT = 1
+    upstream.ATTEMPT_TIMEOUT = 1.5
+    upstream.BACKOFF_BASE = 0.05
+    base = start_stub()
+    breaker = upstream.get_breaker(base)
+    breaker.failure_threshold = 4
+    breaker.reset_timeout = 1
+
+    failures = 0
+
+    def check(label, url, expected, max_seconds, **kwargs):
+        nonlocal failures
+        outcome, elapsed = timed_fetch(url, **kwargs)
+        passed = outcome in expected and elapsed <= max_seconds
+        failures += not passed
+        print(f"{'PASS' if passed else 'FAIL'}  {label:<36} {outcome:<20} {elapsed:5.2f}s "
+              f"(expected {'/'.join(expected)} within {max_seconds}s)")
+
+    check("healthy", f"{base}/ok", ['ok'], 1)
+    check("hang, read timeout", f"{base}/hang", ['ReadTimeout', 'ConnectionError'], 1.5, retries=0)
+    check("byte drip, attempt timeout", f"{base}/drip", ['DeadlineExceeded'], 2, retries=0)
+    # Start each of these from a closed circuit
+    breaker.record_success()
+    check("hang, caller deadline", f"{base}/hang", ['DeadlineExceeded', 'ReadTimeout', 'ConnectionError'], 1,
+          deadline=time.monotonic() + 0.7)
+    breaker.record_success()
+    check("404 is not retried", f"{base}/404", ['HTTPError'], 0.5)
+    print(f"      breaker after 404: {breaker.state}")
+    check("500 retried, then raised", f"{base}/500", ['HTTPError'], 1)
+    print(f"      breaker: {breaker.state}, {breaker.failures} failures")
+
+    # The fourth consecutive failure opens the circuit, so the retry is refused
+    SWITCH['mode'] = '500'
+    check("500 again, circuit opens", f"{base}/switch", ['CircuitOpenError'], 1)
+    print(f"      breaker: {breaker.state}")
+    check("open circuit fails fast", f"{base}/ok", ['CircuitOpenError'], 0.05)
+
+    # After reset_timeout one trial request goes through and closes the circuit
+    SWITCH['mode'] = 'ok'
+    time.sleep(breaker.reset_timeout + 0.1)
+    print(f"      breaker after reset timeout: {breaker.state}")
+    check("half-open trial recovers", f"{base}/switch", ['ok'], 1)
+    print(f"      breaker: {breaker.state}")
+    failures += breaker.state != 'closed'
+
+    print("all checks passed" if not failures else f"{failures} check(s) failed")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+"""
+Build or inspect the warm-state snapshot the web app maps at startup.
+
+    python build_snapshot.py build
+    python build_snapshot.py info -o warm_state.snap
+
+The default file is SNAPSHOT_PATH (WARM_STATE_PATH, or warm_state.snap in
+the project root).
+"""
+import argparse
+import os
+
+from app.snapshot import FORMAT_VERSION, SNAPSHOT_PATH, WarmState, build_snapshot
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect a warm-state snapshot.")
+    parser.add_argument('command', choices=['build', 'info'])
+    parser.add_argument('-o', '--output', default=SNAPSHOT_PATH, help="Snapshot file")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        count = build_snapshot(args.output)
+        print(f"Wrote {args.output} with {count} players ({os.path.getsize(args.output)} bytes)")
+    else:
+        state = WarmState(args.output)
+        print(f"{state.path}: format {FORMAT_VERSION}, built {state.built_at} ({state.age / 3600:.1f}h ago), "
+              f"{len(state.player_names)} players, {state.match_rows} match rows")
+
+if __name__ == "__main__":
+    main()
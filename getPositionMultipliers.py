@@ -1,10 +1,11 @@
-import requests
+import upstream
 from bs4 import BeautifulSoup
 import pandas as pd
+from match_statistics import CSV_PATH
 
-def extract_card_data(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
+def extract_card_data(url, deadline=None):
+    content = upstream.fetch(url, deadline=deadline)
+    soup = BeautifulSoup(content, 'html.parser')
     
     position_heading = soup.find('h4', string='Win rate by position')
     if position_heading:
@@ -134,7 +135,7 @@ def get_position_metrics_from_csv(player_id):
     Uses last 60 matches or all matches if less than 60
     """
     try:
-        df = pd.read_csv('total_matches_new.csv')
+        df = pd.read_csv(CSV_PATH)
         # Sort by match time to get the most recent matches first
         df['Match_Time'] = pd.to_datetime(df['Match_Time'], 
                                         format="%b. %d, %Y, %I:%M %p",
@@ -0,0 +1,234 @@
+import bisect
+import itertools
+import threading
+import pandas as pd
+
+from match_statistics import CSV_PATH, parse_match_times
+
+# Wildcard value for a cube dimension ("any map", "any civ", ...)
+ALL = '*'
+
+class MatchCube:
+    """
+    Aggregate cube of match counts and wins over player, map, civ and position.
+
+    Every match row is rolled up into all 16 wildcard combinations of the four
+    dimensions, bucketed by day. Each cell keeps prefix sums over its days so a
+    slice query with a time window is two dictionary lookups and a bisect.
+    """
+
+    def __init__(self):
+        self._cells = {}    # (player_id, map, civ, position) -> {day_ordinal: [matches, wins]}
+        self._prefix = {}   # same key -> (days, cumulative matches, cumulative wins)
+        self._seen = set()  # (match_id, player_id) rows already counted
+        self._rows = 0
+        self.latest_day = None
+        self.maps = set()
+        self.civs = set()
+        self.read_only = False
+
+    def __len__(self):
+        return self._rows
+
+    @classmethod
+    def from_prefixes(cls, prefixes, latest_day, maps, civs, rows):
+        """
+        Read-only cube over precomputed prefix sums, e.g. arrays mapped from a
+        warm-state snapshot. It answers queries but can't take new matches.
+
+        Args:
+            prefixes (dict): cell key -> (days, cumulative matches, cumulative wins)
+        """
+        cube = cls()
+        cube._prefix = prefixes
+        cube._rows = rows
+        cube.latest_day = latest_day
+        cube.maps = set(maps)
+        cube.civs = set(civs)
+        cube.read_only = True
+        return cube
+
+    def prefixes(self):
+        """
+        Yield (cell key, (days, cumulative matches, cumulative wins)) for every cell
+        """
+        for key in list(self._prefix) if self.read_only else list(self._cells):
+            yield key, self._prefix.get(key) or self._build_prefix(key)
+
+    def add_match(self, match_id, player_id, map_name, civ, position, match_time, won):
+        """
+        Add a single player's result for one match. Rows already in the cube
+        are ignored, so the same CSV can be fed in repeatedly.
+
+        Returns:
+            bool: True if the row was new
+        """
+        if self.read_only:
+            raise ValueError("Can't add matches to a read-only match cube")
+        row_key = (int(match_id), int(player_id))
+        if row_key in self._seen:
+            return False
+        self._seen.add(row_key)
+        self._rows += 1
+
+        day = match_time.toordinal()
+        won = 1 if won else 0
+        dimensions = (int(player_id), _normalize(map_name), _normalize(civ), _normalize(position))
+        self.maps.add(map_name)
+        self.civs.add(civ)
+
+        for mask in itertools.product((False, True), repeat=4):
+            key = tuple(ALL if wildcard else value for value, wildcard in zip(dimensions, mask))
+            bucket = self._cells.setdefault(key, {}).setdefault(day, [0, 0])
+            bucket[0] += 1
+            bucket[1] += won
+            # Prefix sums for this cell are rebuilt on the next query
+            self._prefix.pop(key, None)
+
+        if self.latest_day is None or day > self.latest_day:
+            self.latest_day = day
+        return True
+
+    def add_dataframe(self, df):
+        """
+        Add every row of a match DataFrame (as read from the match CSV).
+
+        Returns:
+            int: Number of new rows added
+        """
+        times = parse_match_times(df['Match_Time'])
+        added = 0
+        for row, match_time in zip(df.itertuples(index=False), times):
+            if pd.isna(match_time):
+                continue
+            added += self.add_match(row.Match_ID, row.MainPlayer_ID, row.Map, row.MainPlayer_Civ,
+                                    row.MainPlayer_Position, match_time, row.MainPlayer_isWon == 1)
+        return added
+
+    def query(self, player_id=ALL, map_name=ALL, civ=ALL, position=ALL, days=None):
+        """
+        Match count and win rate for a slice of the cube.
+
+        Args:
+            player_id (int): Player's AOE2Insights ID, or ALL
+            map_name (str): Map name, or ALL
+            civ (str): Civilization name, or ALL
+            position (str): 'flank', 'pocket', or ALL
+            days (int): Only count the last N calendar days, including the
+                day of the most recent match in the cube. None counts everything.
+
+        Returns:
+            dict: matches, wins and win_rate (percent) for the slice
+        """
+        player_id = player_id if player_id == ALL else int(player_id)
+        key = (player_id, _normalize(map_name), _normalize(civ), _normalize(position))
+        prefix = self._prefix.get(key)
+        if prefix is None:
+            if key not in self._cells:
+                return {'matches': 0, 'wins': 0, 'win_rate': 0}
+            prefix = self._build_prefix(key)
+
+        day_list, cum_matches, cum_wins = prefix
+        start = 0
+        if days is not None:
+            start = bisect.bisect_left(day_list, self.latest_day - int(days) + 1)
+        matches = cum_matches[-1] - cum_matches[start]
+        wins = cum_wins[-1] - cum_wins[start]
+        return {
+            'matches': matches,
+            'wins': wins,
+            'win_rate': (wins / matches * 100) if matches > 0 else 0
+        }
+
+    def _build_prefix(self, key):
+        buckets = self._cells[key]
+        day_list = sorted(buckets)
+        cum_matches = [0]
+        cum_wins = [0]
+        for day in day_list:
+            matches, wins = buckets[day]
+            cum_matches.append(cum_matches[-1] + matches)
+            cum_wins.append(cum_wins[-1] + wins)
+        prefix = (day_list, cum_matches, cum_wins)
+        self._prefix[key] = prefix
+        return prefix
+
+def _normalize(value):
+    if value == ALL or value is None:
+        return ALL
+    return str(value).strip().lower()
+
+_cube = None
+_cube_lock = threading.RLock()
+
+def get_match_cube():
+    """
+    Get the shared match cube, building it from the CSV on first use.
+    Callers arriving during the build wait for it to finish.
+    """
+    global _cube
+    if _cube is None:
+        with _cube_lock:
+            if _cube is None:
+                cube = MatchCube()
+                try:
+                    cube.add_dataframe(pd.read_csv(CSV_PATH))
+                except Exception as e:
+                    print(f"Error loading match data into cube: {str(e)}")
+                _cube = cube
+    return _cube
+
+def set_match_cube(cube):
+    """
+    Use the given cube (such as a read-only one mapped from a snapshot)
+    for all later queries
+    """
+    global _cube
+    with _cube_lock:
+        _cube = cube
+
+def refresh_match_cube(csv_path=CSV_PATH):
+    """
+    Add any matches in the CSV that are not in the cube yet. A read-only
+    cube is replaced by a freshly built one.
+
+    Returns:
+        int: Number of new rows added
+    """
+    global _cube
+    with _cube_lock:
+        cube = get_match_cube()
+        try:
+            df = pd.read_csv(csv_path)
+            if cube.read_only:
+                fresh = MatchCube()
+                added = fresh.add_dataframe(df)
+                _cube = fresh
+                return added - len(cube)
+            return cube.add_dataframe(df)
+        except Exception as e:
+            print(f"Error loading match data into cube: {str(e)}")
+            return 0
+
+def get_map_multiplier(player_id, map_name, position=None):
+    """
+    Calculate a map-aware strength multiplier from the player's win rate on
+    the map (optionally at a given position) compared to their overall win rate.
+    Returns a multiplier between 0.9 and 1.1 (±10%)
+    """
+    cube = get_match_cube()
+    overall = cube.query(player_id)
+    on_map = cube.query(player_id, map_name, position=position or ALL)
+
+    if overall['matches'] == 0 or on_map['matches'] == 0:
+        return 1.0
+
+    # Normalize win rate difference (-1 to 1)
+    winrate_impact = (on_map['win_rate'] - overall['win_rate']) / 50
+
+    # Trust the map sample more as it grows, maxing out at 30 matches
+    experience_weight = min(on_map['matches'] / 30, 1.0)
+
+    multiplier = 1.0 + winrate_impact * experience_weight * 0.1
+
+    return max(0.9, min(1.1, multiplier))
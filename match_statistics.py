@@ -1,18 +1,28 @@
+import os
 import pandas as pd
 from datetime import datetime, timedelta
 
+# Recorded team games, next to this module so it is found from any directory
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'total_matches_new.csv')
+
+def parse_match_times(match_times, errors='coerce'):
+    """
+    Parse the CSV's Match_Time strings (e.g. "Jan. 5, 2025, 8:52 p.m.").
+    Unparseable times become NaT unless errors='raise'.
+    """
+    # Clean up the date string first (remove the period after p.m./a.m.)
+    cleaned = match_times.str.replace('p.m.', 'PM').str.replace('a.m.', 'AM')
+    
+    # Convert Match_Time to datetime using a more flexible parser
+    return pd.to_datetime(cleaned, format='mixed', errors=errors)
+
 def get_recent_match_statistics(player_id):
     """
     Get match statistics for the last 60 days
     """
     try:
-        df = pd.read_csv('total_matches_new.csv')
-        
-        # Clean up the date string first (remove the period after p.m./a.m.)
-        df['Match_Time'] = df['Match_Time'].str.replace('p.m.', 'PM').str.replace('a.m.', 'AM')
-        
-        # Convert Match_Time to datetime using a more flexible parser
-        df['Match_Time'] = pd.to_datetime(df['Match_Time'], format='mixed')
+        df = pd.read_csv(CSV_PATH)
+        df['Match_Time'] = parse_match_times(df['Match_Time'], errors='raise')
         
         # Get most recent date and calculate cutoff
         most_recent_date = df['Match_Time'].max()
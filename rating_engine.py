@@ -0,0 +1,244 @@
+import json
+import os
+import threading
+import pandas as pd
+
+from match_statistics import CSV_PATH, parse_match_times
+
+CHECKPOINT_PATH = os.environ.get(
+    'TEAM_RATING_CHECKPOINT',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'team_ratings.json'))
+CHECKPOINT_VERSION = 1
+
+INITIAL_RATING = 1000
+K_FACTOR = 24
+# New players move faster until their rating has settled
+PROVISIONAL_GAMES = 10
+PROVISIONAL_K_MULTIPLIER = 2
+
+class TeamRatingEngine:
+    """
+    Elo-style team rating built from our own recorded team games.
+
+    Each match is scored as the winning side's mean rating against the losing
+    side's mean rating with the standard Elo expectation; every player on a
+    side moves by the side's rating change, scaled up while the player is
+    still provisional. Matches are applied in time order and remembered by
+    Match_ID, so feeding the same match store again only processes new games.
+    """
+
+    def __init__(self, initial_rating=INITIAL_RATING, k_factor=K_FACTOR):
+        self.initial_rating = initial_rating
+        self.k_factor = k_factor
+        self.players = {}      # player_id -> {'rating', 'games', 'wins', 'name'}
+        self.processed = set()  # Match_IDs already applied
+        self.last_match_time = None
+
+    def rating(self, player_id):
+        player = self.players.get(int(player_id))
+        return player['rating'] if player else self.initial_rating
+
+    def games(self, player_id):
+        player = self.players.get(int(player_id))
+        return player['games'] if player else 0
+
+    def _player(self, player_id, name=None):
+        player = self.players.setdefault(player_id, {
+            'rating': self.initial_rating, 'games': 0, 'wins': 0, 'name': name
+        })
+        if name:
+            player['name'] = name
+        return player
+
+    def apply_match(self, match_id, winners, losers):
+        """
+        Apply one match result.
+
+        Args:
+            match_id (int): Match ID, used to skip matches already applied
+            winners (list): (player_id, name) for each player on the winning side
+            losers (list): (player_id, name) for each player on the losing side
+
+        Returns:
+            bool: True if the match was applied
+        """
+        match_id = int(match_id)
+        if match_id in self.processed or not winners or not losers:
+            return False
+
+        winning = [self._player(int(pid), name) for pid, name in winners]
+        losing = [self._player(int(pid), name) for pid, name in losers]
+
+        winning_rating = sum(p['rating'] for p in winning) / len(winning)
+        losing_rating = sum(p['rating'] for p in losing) / len(losing)
+        expected_win = 1 / (1 + 10 ** ((losing_rating - winning_rating) / 400))
+        change = self.k_factor * (1 - expected_win)
+
+        for player, sign in [(p, 1) for p in winning] + [(p, -1) for p in losing]:
+            k_multiplier = PROVISIONAL_K_MULTIPLIER if player['games'] < PROVISIONAL_GAMES else 1
+            player['rating'] += sign * change * k_multiplier
+            player['games'] += 1
+            player['wins'] += 1 if sign > 0 else 0
+
+        self.processed.add(match_id)
+        return True
+
+    def apply_dataframe(self, df):
+        """
+        Apply every match in a match DataFrame (as read from the match CSV)
+        that hasn't been applied yet, oldest first.
+
+        Returns:
+            int: Number of new matches applied
+        """
+        new_rows = df[~df['Match_ID'].isin(self.processed)]
+        if len(new_rows) == 0:
+            return 0
+
+        new_rows = new_rows.assign(Match_Time=parse_match_times(new_rows['Match_Time']))
+        new_rows = new_rows.dropna(subset=['Match_Time']).sort_values(['Match_Time', 'Match_ID'])
+
+        applied = 0
+        for match_id, rows in new_rows.groupby('Match_ID', sort=False):
+            # MainPlayer_Team isn't reliable in the export, so sides come from the result
+            players = list(zip(rows['MainPlayer_ID'], rows['MainPlayer_Name']))
+            won = (rows['MainPlayer_isWon'] == 1).tolist()
+            winners = [p for p, w in zip(players, won) if w]
+            losers = [p for p, w in zip(players, won) if not w]
+            if self.apply_match(match_id, winners, losers):
+                applied += 1
+                match_time = rows['Match_Time'].iloc[0].isoformat()
+                if self.last_match_time is None or match_time > self.last_match_time:
+                    self.last_match_time = match_time
+        return applied
+
+    def to_dict(self):
+        return {
+            'version': CHECKPOINT_VERSION,
+            'initial_rating': self.initial_rating,
+            'k_factor': self.k_factor,
+            'last_match_time': self.last_match_time,
+            'players': {str(pid): p for pid, p in self.players.items()},
+            'processed': sorted(self.processed)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version: {data.get('version')}")
+        engine = cls(data['initial_rating'], data['k_factor'])
+        engine.last_match_time = data.get('last_match_time')
+        engine.players = {int(pid): p for pid, p in data['players'].items()}
+        engine.processed = set(data['processed'])
+        return engine
+
+    def save(self, path=CHECKPOINT_PATH):
+        """
+        Write the engine state to a checkpoint file (atomically)
+        """
+        # Unique per writer, so concurrent saves don't clobber each other's file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CHECKPOINT_PATH):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+_engine = None
+_engine_lock = threading.RLock()
+
+def get_rating_engine():
+    """
+    Get the shared rating engine, resuming from the checkpoint if there is
+    one and applying any matches added to the CSV since. The engine is only
+    shared once that is done, so concurrent callers never see a half-built one.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = _resume_engine(CHECKPOINT_PATH)
+                update_ratings(engine=engine)
+                _engine = engine
+    return _engine
+
+def load_rating_engine(csv_path=CSV_PATH, checkpoint_path=CHECKPOINT_PATH):
+    """
+    A private rating engine, resumed from the checkpoint and brought up to
+    date with the CSV without writing a new checkpoint (for command line use)
+    """
+    engine = _resume_engine(checkpoint_path)
+    try:
+        engine.apply_dataframe(pd.read_csv(csv_path))
+    except Exception as e:
+        print(f"Error applying match data to ratings: {str(e)}")
+    return engine
+
+def _resume_engine(checkpoint_path):
+    try:
+        return TeamRatingEngine.load(checkpoint_path)
+    except FileNotFoundError:
+        return TeamRatingEngine()
+    except Exception as e:
+        print(f"Error loading rating checkpoint, rebuilding: {str(e)}")
+        return TeamRatingEngine()
+
+def set_rating_engine(engine):
+    """
+    Replace the shared rating engine, e.g. with one restored from a snapshot
+    """
+    global _engine
+    with _engine_lock:
+        _engine = engine
+
+def update_ratings(csv_path=CSV_PATH, checkpoint_path=CHECKPOINT_PATH, engine=None):
+    """
+    Apply new matches from the CSV to the engine (the shared one by default)
+    and checkpoint the result
+
+    Returns:
+        int: Number of new matches applied
+    """
+    with _engine_lock:
+        if engine is None:
+            engine = get_rating_engine()
+        try:
+            applied = engine.apply_dataframe(pd.read_csv(csv_path))
+        except Exception as e:
+            print(f"Error applying match data to ratings: {str(e)}")
+            return 0
+
+        if applied:
+            try:
+                engine.save(checkpoint_path)
+            except OSError as e:
+                print(f"Error saving rating checkpoint: {str(e)}")
+        return applied
+
+def rating_metrics(player_id, name=None, engine=None):
+    """
+    Build a metrics dict for a player from their team rating alone (from
+    the shared engine unless one is given), in the same shape as
+    calculate_metrics, so teams can be compared and balanced without
+    fetching any Elo history.
+    """
+    engine = engine or get_rating_engine()
+    rating = engine.rating(player_id)
+    return {
+        'name': name,
+        'player_id': player_id,
+        'team_rating': rating,
+        'team_rating_games': engine.games(player_id),
+        'arithmetic_mean': rating,
+        'weighted_average': rating,
+        'max_elo': rating,
+        'current_elo': rating,
+        'trend': rating - engine.initial_rating,
+        'min_elo': rating,
+        'avg_elo': rating,
+        'median_elo': rating,
+        'elos': [rating]
+    }
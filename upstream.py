@@ -0,0 +1,176 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+
+# Seconds to wait for a connection, and between bytes once connected
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 5
+# Cap on a single attempt including the body download, so a server that
+# drips bytes slowly can't hold a request open forever
+ATTEMPT_TIMEOUT = 8
+
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.25
+BACKOFF_MAX = 2
+
+# Open the circuit after this many consecutive failures, and try again
+# after this many seconds
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30
+
+class UpstreamError(Exception):
+    """Raised when an upstream request can't be completed."""
+
+class CircuitOpenError(UpstreamError):
+    """Raised without contacting the upstream because its circuit is open."""
+
+class DeadlineExceeded(UpstreamError):
+    """Raised when the caller's deadline runs out."""
+
+class CircuitBreaker:
+    """
+    Stops requests to an upstream after repeated failures.
+
+    Closed: requests go through. After failure_threshold consecutive
+    failures the circuit opens and requests fail immediately. Once
+    reset_timeout has passed a single trial request is let through
+    (half-open); its success closes the circuit, its failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(url):
+    """
+    Get the circuit breaker for the URL's host
+    """
+    host = urlparse(url).netloc
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+def _is_retryable(error):
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status is None or status >= 500 or status == 429
+    # Raw body reads raise urllib3 errors rather than requests ones
+    return isinstance(error, (requests.RequestException, urllib3.exceptions.HTTPError,
+                              OSError, UpstreamError))
+
+def _get_once(url, attempt_deadline):
+    remaining = max(attempt_deadline - time.monotonic(), 0.01)
+    response = requests.get(url, timeout=(min(CONNECT_TIMEOUT, remaining), min(READ_TIMEOUT, remaining)),
+                            stream=True)
+    try:
+        response.raise_for_status()
+        chunks = []
+        while True:
+            # read1 returns as soon as any data arrives, so the deadline is
+            # checked even when the server sends the body a byte at a time
+            chunk = response.raw.read1(8192, decode_content=True)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if time.monotonic() > attempt_deadline:
+                raise DeadlineExceeded(f"Timed out reading response from {url}")
+        return b''.join(chunks)
+    finally:
+        response.close()
+
+def fetch(url, retries=MAX_RETRIES, deadline=None):
+    """
+    GET a URL and return the response body, with connect/read timeouts,
+    bounded retries with jittered exponential backoff, and a per-host
+    circuit breaker.
+
+    Args:
+        url (str): URL to fetch
+        retries (int): Extra attempts after the first one fails
+        deadline (float): time.monotonic() value after which to give up
+
+    Returns:
+        bytes: The response body
+
+    Raises:
+        CircuitOpenError: If the host's circuit is open
+        DeadlineExceeded: If the deadline ran out
+        requests.RequestException: If the last attempt failed
+    """
+    breaker = get_breaker(url)
+
+    for attempt in range(retries + 1):
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            raise DeadlineExceeded(f"Deadline exceeded fetching {url}")
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {urlparse(url).netloc}")
+        attempt_deadline = now + ATTEMPT_TIMEOUT
+        if deadline is not None:
+            attempt_deadline = min(attempt_deadline, deadline)
+
+        try:
+            content = _get_once(url, attempt_deadline)
+        except Exception as e:
+            if not _is_retryable(e):
+                if isinstance(e, requests.HTTPError):
+                    # The upstream answered (e.g. 404), so it isn't failing
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+                raise
+            breaker.record_failure()
+            if attempt == retries:
+                raise
+
+            backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1)
+            if deadline is not None and time.monotonic() + backoff >= deadline:
+                raise
+            time.sleep(backoff)
+            continue
+
+        breaker.record_success()
+        return content